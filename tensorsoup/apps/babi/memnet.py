@@ -21,7 +21,8 @@ def train_separate(task, dataset='1k', iterations=1,
     dformat = [ 'contexts', 'questions', 'answers' ]
 
     # create feeds
-    trainfeed = DataFeed(dformat, data=data['train'])
+    #  shuffle training examples every epoch
+    trainfeed = DataFeed(dformat, data=data['train'], shuffle=True)
     testfeed  = DataFeed(dformat, data=data['test' ])
 
     hdim = 20 if task else 50
@@ -146,7 +147,7 @@ def train_separate_all(dataset='1k'):
         dformat = [ 'contexts', 'questions', 'answers' ]
 
         # create feeds
-        trainfeed = DataFeed(dformat, data=data['train'])
+        trainfeed = DataFeed(dformat, data=data['train'], shuffle=True)
         testfeed  = DataFeed(dformat, data=data['test' ])
 
         # instantiate model
@@ -9,21 +9,24 @@ from tasks.cbt.proc import FIELDS
 
 from train.trainer import Trainer
 from models.model import Model
-from datafeed import DataFeed
+from datafeed import BucketFeed
 from graph import *
 
 
 if __name__ == '__main__':
 
     # get data for task
-    data, lookup, metadata = gather()
+    #  (unpadded; feeds pad each batch to its own maximum)
+    data, lookup, metadata = gather(pad=False)
 
     # build data format
-    dformat = FIELDS + ['cmask']
+    #  candidate mask is derived in graph
+    dformat = FIELDS
 
     # create feeds
-    trainfeed = DataFeed(dformat, data=data['valid'])
-    testfeed  = DataFeed(dformat, data=data['test' ])
+    #  bucket examples by context length
+    trainfeed = BucketFeed(dformat, data=data['valid'], key='context')
+    testfeed  = BucketFeed(dformat, data=data['test' ], key='context')
 
     # training params
     batch_size = 32
@@ -35,7 +38,8 @@ if __name__ == '__main__':
             vocab_size=metadata['vocab_size'],
             max_candidates= metadata['max_candidates'],
             demb=384, dhdim=384,
-            num_layers=1)
+            num_layers=1,
+            derive_cmask=True)
 
     config = tf.ConfigProto(allow_soft_placement=True)
     with tf.Session(config=config) as sess:
@@ -15,8 +15,17 @@ if __name__ == '__main__':
     
     batch_size = 90
 
+    # create data source (SQuAD)
+    #  batches of token ids, embedded in graph
+    #  (no shared passages : batch is split among towers,
+    #   see Trainer.check_towers)
+    datasrc = DataSource(batch_size, 
+            glove_file='../../../datasets/glove/glove.6B.300d.txt', 
+            random_x=0.2, glove_vocab_only=True, as_indices=True)
+
     # instantiate model
-    model = MatchLSTM(emb_dim=300, hidden_dim=200, lr=0.0005)
+    model = MatchLSTM(emb_dim=300, hidden_dim=200, lr=0.0005, 
+            vocab_size=datasrc.vocab_size)
 
     # make 'n' copies of model for data parallelism
     make_parallel(model, num_copies=4, num_gpus=4)
@@ -27,19 +36,15 @@ if __name__ == '__main__':
     vis.attach_scalars(model)
     vis.attach_params() # histograms of trainable variables
 
-
-    # create data source (SQuAD)
-    datasrc = DataSource(batch_size, 
-            glove_file='../../../datasets/glove/glove.6B.300d.txt', 
-            random_x=0.2)
-
     # gpu config
     config = tf.ConfigProto()
     #config.gpu_options.allow_growth = True
 
     with tf.Session(config=config) as sess:
         # init session
-        sess.run(tf.global_variables_initializer())
+        #  glove is fed once to its initializer
+        sess.run(tf.global_variables_initializer(), 
+                feed_dict = { model.emb_init : datasrc.embedding_matrix() })
 
         vis.attach_graph(sess.graph)
 
@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class BatchCache(object):
+    '''
+        bounded LRU cache of batches (tuples of arrays)
+
+         batches are kept in memory up to 'max_bytes'; the least
+          recently used batches are evicted beyond that
+
+         if 'spill_dir' is set, evicted batches are written to
+          .npy files and mapped back (mmap_mode='r') on a hit,
+           instead of being recomputed; spilled batches take up
+            to 'max_spill_bytes' of disk, oldest are deleted beyond
+
+         spill files live in a scratch dir under 'spill_dir',
+          removed by close() or when the cache is collected
+
+        [usage]
+        cache = BatchCache(max_bytes=2**30, spill_dir='/tmp/batches')
+        batch = cache.get(key)
+        if batch is None:
+            batch = make_batch()
+            cache.put(key, batch)
+        cache.close()
+
+    '''
+    def __init__(self, max_bytes=2**30, spill_dir=None, max_spill_bytes=2**32):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        # key -> batch; most recent last
+        self.batches = OrderedDict()
+        # key -> (num of arrays, bytes) spilled to disk; most recent last
+        self.spilled = OrderedDict()
+        self.max_spill_bytes = max_spill_bytes
+        self.spill_bytes = 0
+
+        self.spill_dir = spill_dir
+        if spill_dir:
+            # scratch dir of this cache
+            if not os.path.isdir(spill_dir):
+                os.makedirs(spill_dir)
+            self.spill_dir = tempfile.mkdtemp(dir=spill_dir)
+            # removed at close, collection or exit
+            self._cleanup = weakref.finalize(self, shutil.rmtree, 
+                    self.spill_dir, True)
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spill_hits = 0
+
+        # batches are put by prefetch workers
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __contains__(self, key):
+        return key in self.batches or key in self.spilled
+
+    def get(self, key):
+        with self.lock:
+            if key in self.batches:
+                self.hits += 1
+                self.batches.move_to_end(key)
+                return self.batches[key]
+
+            if key in self.spilled:
+                self.spill_hits += 1
+                self.spilled.move_to_end(key)
+                return tuple( np.load(self.spill_file(key, j), mmap_mode='r')
+                        for j in range(self.spilled[key][0]) )
+
+            self.misses += 1
+
+    def put(self, key, batch):
+        size = batch_nbytes(batch)
+        # never fits
+        if size > self.max_bytes:
+            return
+
+        evicted = []
+        with self.lock:
+            if key in self.batches:
+                self.nbytes -= batch_nbytes(self.batches.pop(key))
+
+            self.batches[key] = batch
+            self.nbytes += size
+
+            # evict least recently used
+            while self.nbytes > self.max_bytes:
+                old_key, old_batch = self.batches.popitem(last=False)
+                self.nbytes -= batch_nbytes(old_batch)
+                self.evictions += 1
+                evicted.append((old_key, old_batch))
+
+        # disk writes do not block readers
+        if self.spill_dir:
+            for old_key, old_batch in evicted:
+                self.spill(old_key, old_batch)
+
+    def spill_file(self, key, j):
+        name = '_'.join(map(str, key)) if isinstance(key, tuple) else str(key)
+        return os.path.join(self.spill_dir, '{}.{}.npy'.format(name, j))
+
+    def spill(self, key, batch):
+        size = batch_nbytes(batch)
+        if key in self.spilled or size > self.max_spill_bytes:
+            return
+        for j, item in enumerate(batch):
+            np.save(self.spill_file(key, j), np.asarray(item))
+
+        with self.lock:
+            self.spilled[key] = (len(batch), size)
+            self.spill_bytes += size
+            # delete oldest spilled batches
+            while self.spill_bytes > self.max_spill_bytes:
+                old_key, (count, old_size) = self.spilled.popitem(last=False)
+                self.spill_bytes -= old_size
+                for j in range(count):
+                    os.remove(self.spill_file(old_key, j))
+
+    def stats(self):
+        return { 'hits' : self.hits, 'misses' : self.misses,
+                'evictions' : self.evictions, 'spill_hits' : self.spill_hits,
+                'nbytes' : self.nbytes, 'batches' : len(self.batches),
+                'spilled' : len(self.spilled), 'spill_bytes' : self.spill_bytes }
+
+    def clear(self):
+        with self.lock:
+            self.batches.clear()
+            self.nbytes = 0
+            if self.spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                os.makedirs(self.spill_dir)
+            self.spilled = OrderedDict()
+            self.spill_bytes = 0
+
+    def close(self):
+        # drop batches and scratch dir
+        with self.lock:
+            self.batches.clear()
+            self.nbytes = 0
+            self.spilled = OrderedDict()
+            self.spill_bytes = 0
+        if self.spill_dir:
+            self._cleanup()
+
+
+def batch_nbytes(batch):
+    return sum( np.asarray(item).nbytes for item in batch )
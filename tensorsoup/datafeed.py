@@ -1,6 +1,36 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+from tproc.ragged import Ragged
+
+
+# select rows of a field by index
+#  copies only the selected rows
+def take(v, idx):
+    if isinstance(v, (np.ndarray, Ragged)):
+        return v[idx]
+    return [ v[i] for i in idx ]
+
+
+# drop trailing PAD along each axis but the first
+#  (padded to dataset maximum -> batch maximum)
+def trim(rows, PAD=0):
+    used = rows != PAD
+    for axis in range(1, rows.ndim):
+        other = tuple( a for a in range(rows.ndim) if a != axis )
+        extent = np.flatnonzero(used.any(axis=other))
+        # keep at least one position
+        end = extent[-1] + 1 if len(extent) else 1
+        rows = rows[(slice(None),)*axis + (slice(0, end),)]
+    return rows
+
+
 class DataFeed(object):
-     
-    def __init__(self, dformat, data=None):
+
+    def __init__(self, dformat, data=None, shuffle=False):
 
         # current iteration
         self.offset = 0
@@ -14,12 +44,18 @@ class DataFeed(object):
         # default batch size
         self.B = 2
 
+        # visit examples in a new order every epoch
+        self.shuffle = shuffle
+        self.perm = None
+        # own random state -> restored with checkpoints
+        self.rng = np.random.RandomState(np.random.randint(2**31))
+
         # if data available
         if data:
             self.bind(data)
 
 
-    ''' 
+    '''
         bind data to feed
 
     '''
@@ -31,6 +67,20 @@ class DataFeed(object):
         self.n = len(data[self.dformat[0]])
         # bind data to instance
         self.data = data
+        # order of examples in first epoch
+        self.new_epoch()
+
+
+    '''
+        draw permutation of examples for next epoch
+
+         data is never copied or reordered, batches
+          gather their rows through the permutation
+
+    '''
+    def new_epoch(self):
+        if self.shuffle:
+            self.perm = self.rng.permutation(self.n)
 
 
     '''
@@ -40,7 +90,21 @@ class DataFeed(object):
     def getN(self):
         return self.n
 
-    
+
+    '''
+        position in data (checkpoints)
+
+    '''
+    def state(self):
+        return { 'offset' : self.offset, 'perm' : self.perm,
+                'rng' : self.rng.get_state() }
+
+    def restore(self, state):
+        self.offset = state['offset']
+        self.perm = state['perm']
+        self.rng.set_state(state['rng'])
+
+
     '''
         get batch next to offset
 
@@ -52,6 +116,11 @@ class DataFeed(object):
         # update offset
         self.offset += batch_size
 
+        # gather rows of current batch
+        if self.shuffle:
+            idx = self.perm[s:e]
+            return [ take(self.data[k], idx) for k in self.dformat ]
+
         # select items from data format
         return [ self.data[k][s:e] for k in self.dformat ]
 
@@ -65,5 +134,307 @@ class DataFeed(object):
         if self.offset + batch_size > self.n:
             # star over
             self.offset = 0
+            # reshuffle
+            self.new_epoch()
         # return batch
         return self.batch(batch_size)
+
+
+    '''
+        prepare batches in background
+
+         returns a Prefetcher that keeps 'size' batches
+          of 'batch_size' ready while the session runs
+
+    '''
+    def prefetch(self, batch_size, size=4):
+        return Prefetcher(lambda : self.next_batch(batch_size),
+                n=self.n, size=size, state=self.state, restore=self.restore,
+                batch_size=batch_size)
+
+
+class BucketFeed(DataFeed):
+    '''
+        feed batches of examples of similar length
+
+         examples are sorted by the length of 'key' and split into
+          'num_buckets' buckets; every epoch, examples are shuffled
+           within each bucket, cut into batches and the batches are
+            shuffled across buckets
+
+         ragged fields (Ragged or list of lists) are padded to the longest
+          sequence in the batch; padded 2D/3D arrays are trimmed to
+           the batch's non-PAD extent (trim=False -> fixed shapes)
+
+         'transform' takes a dict of batch fields (dformat plus
+          'fields') and returns it with derived fields (say, masks)
+
+    '''
+    def __init__(self, dformat, data=None, key=None,
+            num_buckets=10, PAD=0, transform=None, fields=(), trim=True):
+
+        # field that decides length of example
+        self.key = key if key else dformat[0]
+        self.num_buckets = num_buckets
+        self.PAD = PAD
+        self.transform = transform
+        # fields read by transform only
+        self.fields = list(fields)
+        self.trim = trim
+
+        # batches (indices) of current epoch
+        self.batches = []
+        self.batch_size = 0
+
+        super(BucketFeed, self).__init__(dformat, data)
+
+
+    '''
+        bind data to feed
+
+    '''
+    def bind(self, data):
+        # start over
+        self.offset = 0
+        self.batches = []
+        # get num of examples
+        self.n = len(data[self.key])
+        # bind data to instance
+        self.data = data
+        # length of each example
+        self.lengths = self.seqlens(data[self.key])
+
+
+    def state(self):
+        return { 'offset' : self.offset, 'batches' : self.batches,
+                'batch_size' : self.batch_size, 'rng' : self.rng.get_state() }
+
+    def restore(self, state):
+        self.offset = state['offset']
+        self.batches = state['batches']
+        self.batch_size = state['batch_size']
+        self.rng.set_state(state['rng'])
+
+
+    def seqlens(self, seqs):
+        # padded array -> count non-pad items
+        if isinstance(seqs, np.ndarray):
+            return (seqs != self.PAD).reshape(len(seqs), -1).sum(axis=1)
+        if isinstance(seqs, Ragged):
+            return seqs.lengths()
+        return np.array([ len(seq) for seq in seqs ])
+
+
+    '''
+        shuffle within buckets and across batches
+
+    '''
+    def new_epoch(self):
+        # batch size of last next_batch
+        batch_size = self.batch_size
+        if not batch_size:
+            # nothing to cut before first next_batch
+            self.batches, self.offset = [], 0
+            return
+        if not self.n:
+            raise ValueError('BucketFeed has no examples')
+
+        # sort by length -> split into buckets
+        order = np.argsort(self.lengths, kind='mergesort')
+        buckets = np.array_split(order, self.num_buckets)
+
+        # shuffle within buckets
+        order = np.concatenate([ self.rng.permutation(bucket) 
+            for bucket in buckets ])
+
+        # cut into batches (drop the last incomplete batch)
+        #  fewer examples than batch_size -> one partial batch
+        self.batches = [ order[s:s+batch_size] 
+                for s in range(0, self.n - batch_size + 1, batch_size) 
+                ] or [ order ]
+        # shuffle batches
+        self.rng.shuffle(self.batches)
+
+        self.offset = 0
+
+
+    '''
+        gather examples by index
+
+         pad ragged fields to batch maximum
+
+    '''
+    def gather(self, idx):
+        batch = {}
+        # derived fields are not in data
+        keys = [ k for k in self.dformat + self.fields if k in self.data ]
+        for k in keys:
+            rows = take(self.data[k], idx)
+            if isinstance(rows, list):
+                if isinstance(rows[0], list):
+                    rows = Ragged.from_list(rows)
+                else:
+                    rows = np.array(rows)
+            if isinstance(rows, Ragged):
+                # pad to longest in batch
+                rows = rows.pad(PAD=self.PAD)
+            elif self.trim and rows.ndim in (2, 3):
+                rows = trim(rows, self.PAD)
+            batch[k] = rows
+
+        if self.transform:
+            batch = self.transform(batch)
+
+        return [ batch[k] for k in self.dformat ]
+
+
+    '''
+        get next batch
+
+    '''
+    def next_batch(self, batch_size=1):
+        # check limit
+        if batch_size != self.batch_size or self.offset >= len(self.batches):
+            # reshuffle
+            self.batch_size = batch_size
+            self.new_epoch()
+
+        bi = self.gather(self.batches[self.offset])
+        self.offset += 1
+        return bi
+
+
+class Prefetcher(object):
+    '''
+        wraps a batch source with a bounded queue
+
+        a daemon thread calls 'fetch' and keeps up to 'size'
+         batches ready, so slicing and padding overlap with
+          sess.run; 'wait_time' accumulates the seconds the
+           consumer spent blocked on an empty queue
+
+        the wrapped feed must not be used directly while
+         the prefetcher is running
+
+        'state' and 'restore' (optional) get/set the position
+         of the wrapped feed; state() reports the position after
+          the last batch handed out, not after the last one fetched
+
+    '''
+    def __init__(self, fetch, n, size=4, state=None, restore=None,
+            batch_size=None):
+        # zero-arg callable -> batch
+        self.fetch = fetch
+        # num of examples in underlying feed
+        self.n = n
+        # size of batches 'fetch' returns (if known)
+        self.batch_size = batch_size
+
+        # position of wrapped feed
+        self._get_state = state
+        self._set_state = restore
+        self._state = state() if state else None
+
+        # bounded queue of ready batches
+        self.queue = queue.Queue(maxsize=size)
+
+        # metrics
+        self.wait_time = 0.
+        self.num_batches = 0
+
+        self.start()
+
+    def start(self):
+        # start worker
+        self._stop = threading.Event()
+        self._error = None
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                batch = self.fetch()
+                # position of feed after this batch
+                state = self._get_state() if self._get_state else None
+                # block until there is room
+                #  check stop flag periodically
+                while not self._stop.is_set():
+                    try:
+                        self.queue.put((batch, state), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            # surface worker errors in consumer
+            self._error = e
+            # wake up consumer blocked on empty queue
+            try:
+                self.queue.put((None, None), timeout=0.1)
+            except queue.Full:
+                pass
+
+    def getN(self):
+        return self.n
+
+    '''
+        get next prepared batch
+
+         batch size is fixed when the prefetcher is built;
+          a different 'batch_size' is an error
+
+         a worker error is raised once the batches prepared
+          before it are consumed, and on every later call
+
+    '''
+    def next_batch(self, batch_size=None, *args, **kwargs):
+        assert batch_size is None or self.batch_size is None or \
+                batch_size == self.batch_size, \
+                'prefetcher built for batch size {}, got {}'.format(
+                        self.batch_size, batch_size)
+
+        # ready batches are handed out before the error
+        if self._error and self.queue.empty():
+            raise self._error
+
+        start = time.time()
+        batch, state = self.queue.get()
+        self.wait_time += time.time() - start
+        self.num_batches += 1
+
+        if batch is None and self._error:
+            raise self._error
+
+        self._state = state
+        return batch
+
+    def state(self):
+        return self._state
+
+    '''
+        move wrapped feed to 'state'
+
+         drops prepared batches and restarts worker
+
+    '''
+    def restore(self, state):
+        self.close()
+        # drop prepared batches
+        while not self.queue.empty():
+            self.queue.get()
+
+        self._set_state(state)
+        self._state = state
+        self.start()
+
+    def avg_wait(self):
+        return self.wait_time/max(self.num_batches, 1)
+
+    def reset_stats(self):
+        self.wait_time = 0.
+        self.num_batches = 0
+
+    def close(self):
+        self._stop.set()
+        self._worker.join()
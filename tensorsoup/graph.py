@@ -15,3 +15,57 @@ def set_op(values):
 '''
 def get_op(sess):
     return sess.run(tf.trainable_variables())
+
+
+class Snapshot(object):
+    '''
+        in-graph copy of variables
+
+         shadow variables live next to the originals;
+          save and restore ops are built once, so taking or
+           restoring a snapshot is a single sess.run with no
+            host round-trip and no new ops
+
+         shadows are kept out of all collections
+          (not trainable, not saved, not initialized by
+           global_variables_initializer; see init_op)
+
+        [usage]
+        snapshot = Snapshot.of(model)
+        snapshot.save(sess)     # best params so far
+        snapshot.restore(sess)  # back to best params
+
+    '''
+    def __init__(self, variables=None, name='snapshot'):
+        self.variables = variables if variables is not None else tf.trainable_variables()
+
+        shadows = []
+        with tf.name_scope(name):
+            for var in self.variables:
+                with tf.device(var.device):
+                    shadows.append(tf.Variable(
+                        tf.zeros(var.get_shape(), dtype=var.dtype.base_dtype),
+                        trainable=False, collections=[],
+                        name=var.op.name.replace('/', '_')))
+        self.shadows = shadows
+        # zeros, only needed if shadows are read before first save
+        self.init_op = tf.variables_initializer(shadows, name=name + '_init')
+
+        # assign initializes shadows on first save
+        self.save_op = tf.group(*[ tf.assign(s, v) 
+            for s, v in zip(self.shadows, self.variables) ], name=name + '_save')
+        self.restore_op = tf.group(*[ tf.assign(v, s) 
+            for s, v in zip(self.shadows, self.variables) ], name=name + '_restore')
+
+    @classmethod
+    def of(cls, model):
+        # one snapshot per model
+        if getattr(model, 'snapshot', None) is None:
+            model.snapshot = cls()
+        return model.snapshot
+
+    def save(self, sess):
+        sess.run(self.save_op)
+
+    def restore(self, sess):
+        sess.run(self.restore_op)
@@ -20,7 +20,7 @@ num_layers = 3
 class ASReader(object):
 
     def __init__(self, vocab_size, max_candidates,
-            demb, dhdim, num_layers):
+            demb, dhdim, num_layers, derive_cmask=False):
 
         # clear global graph
         tf.reset_default_graph()
@@ -40,8 +40,10 @@ class ASReader(object):
                                 name= 'answer')
         self._candidates = tf.placeholder(tf.int32, [None, max_candidates],
                                     name='candidates')
-        self._cmask = tf.placeholder(tf.float32, [None, max_candidates, None],
-                               name='cmask')
+        # candidate mask is either fed or derived in graph
+        #  from context and candidates
+        self._cmask = None if derive_cmask else tf.placeholder(tf.float32, 
+                [None, max_candidates, None], name='cmask')
 
         # default placeholders
         mode = tf.placeholder(tf.int32, shape=[], name='mode')
@@ -62,7 +64,13 @@ class ASReader(object):
         #  shape : [batch_size, clen + len(pad)]
         _context = tf.slice( self._context, [0, 0], [-1, clen] )
         _query   = tf.slice( self._query  , [0, 0], [-1, qlen] )
-        _cmask   = tf.slice( self._cmask  , [0, 0, 0], [-1, -1, clen] )
+        if derive_cmask:
+            # mark positions where context matches candidate
+            #  shape : [batch_size, max_candidates, clen]
+            _cmask = tf.cast(tf.equal(tf.expand_dims(_context, axis=1),
+                tf.expand_dims(self._candidates, axis=-1)), tf.float32)
+        else:
+            _cmask = tf.slice( self._cmask  , [0, 0, 0], [-1, -1, clen] )
 
         # setup embedding matrix
         emb = tf.get_variable('emb', [vocab_size, demb], tf.float32,
@@ -149,7 +157,9 @@ class ASReader(object):
         self.lr = lr
 
         self.placeholders = [ self._context, self._query, 
-                self._answer, self._candidates, self._cmask ]
+                self._answer, self._candidates ]
+        if not derive_cmask:
+            self.placeholders.append(self._cmask)
 
 
 
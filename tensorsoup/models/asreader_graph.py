@@ -17,24 +17,29 @@ dhdim = 32
 num_layers = 3
 
 from models.graph import Graph
+from pipeline import placeholder
         
 class ASReaderGraph(Graph):
 
     def __init__(self, vocab_size, max_candidates,
-            demb, dhdim, num_layers):
+            demb, dhdim, num_layers, derive_cmask=False,
+            inputs=None): # Pipeline.tensors
 
         self.init = tf.random_uniform_initializer(-0.1, 0.1)
         # define placeholders
-        self._context = tf.placeholder(tf.int32, [None, None ], 
-                                  name = 'context')
-        self._query = tf.placeholder(tf.int32, [None, None],
-                               name= 'query')
-        self._answer = tf.placeholder(tf.int32, [None, ], 
-                                name= 'answer')
-        self._candidates = tf.placeholder(tf.int32, [None, max_candidates],
-                                    name='candidates')
-        self._cmask = tf.placeholder(tf.float32, [None, max_candidates, None],
-                               name='cmask')
+        #  (default to pipeline tensors if given)
+        self._context = placeholder(tf.int32, [None, None ], 
+                                  name = 'context', inputs=inputs)
+        self._query = placeholder(tf.int32, [None, None],
+                               name= 'query', inputs=inputs)
+        self._answer = placeholder(tf.int32, [None, ], 
+                                name= 'answer', inputs=inputs)
+        self._candidates = placeholder(tf.int32, [None, max_candidates],
+                                    name='candidates', inputs=inputs)
+        # candidate mask is either fed or derived in graph
+        #  from context and candidates
+        self._cmask = None if derive_cmask else placeholder(tf.float32, 
+                [None, max_candidates, None], name='cmask', inputs=inputs)
 
         # default placeholders
         mode = tf.placeholder(tf.int32, shape=[], name='mode')
@@ -55,7 +60,13 @@ class ASReaderGraph(Graph):
         #  shape : [batch_size, clen + len(pad)]
         _context = tf.slice( self._context, [0, 0], [-1, clen] )
         _query   = tf.slice( self._query  , [0, 0], [-1, qlen] )
-        _cmask   = tf.slice( self._cmask  , [0, 0, 0], [-1, -1, clen] )
+        if derive_cmask:
+            # mark positions where context matches candidate
+            #  shape : [batch_size, max_candidates, clen]
+            _cmask = tf.cast(tf.equal(tf.expand_dims(_context, axis=1),
+                tf.expand_dims(self._candidates, axis=-1)), tf.float32)
+        else:
+            _cmask = tf.slice( self._cmask  , [0, 0, 0], [-1, -1, clen] )
 
         # setup embedding matrix
         emb = tf.get_variable('emb', [vocab_size, demb], tf.float32,
@@ -147,6 +158,7 @@ class ASReaderGraph(Graph):
                 'context' : self._context, 
                 'query' : self._query, 
                 'answer' : self._answer, 
-                'candidates' : self._candidates, 
-                'cmask' : self._cmask 
+                'candidates' : self._candidates
                 }
+        if not derive_cmask:
+            self.placeholders['cmask'] = self._cmask
@@ -13,15 +13,30 @@ from collections import OrderedDict
 
 class MatchLSTM():
 
-    def __init__(self, emb_dim, hidden_dim, lr=0.0001):
+    def __init__(self, emb_dim, hidden_dim, lr=0.0001, vocab_size=None,
+            share_passages=False):
 
         self.emb_dim = emb_dim
         self.d = hidden_dim
         self.lr = lr
 
+        # passages/queries as token ids
+        #  (embedded in graph) if vocab_size is given
+        self.vocab_size = vocab_size
+
+        # passages holds unique passages of batch;
+        #  'pidx' maps each question to its passage
+        self.share_passages = share_passages
+
         # clear graph
         tf.reset_default_graph()
 
+        # embedding matrix is fed once to the initializer
+        #  instead of being stored as a constant in GraphDef
+        if vocab_size:
+            self.emb_init = tf.placeholder(shape=[vocab_size, emb_dim],
+                    dtype=tf.float32, name='emb_init')
+
         # initializer
         self.init = tf.random_normal_initializer(-0.08, 0.08)
 
@@ -48,10 +63,16 @@ class MatchLSTM():
     def inference(self):
 
         # placeholders
-        passages = tf.placeholder(shape=[None, None, self.emb_dim], 
-                dtype=tf.float32, name='passages')
-        queries = tf.placeholder(shape=[None, None, self.emb_dim], 
-                dtype=tf.float32, name='queries')
+        if self.vocab_size:
+            passages = tf.placeholder(shape=[None, None], 
+                    dtype=tf.int32, name='passages')
+            queries = tf.placeholder(shape=[None, None], 
+                    dtype=tf.int32, name='queries')
+        else:
+            passages = tf.placeholder(shape=[None, None, self.emb_dim], 
+                    dtype=tf.float32, name='passages')
+            queries = tf.placeholder(shape=[None, None, self.emb_dim], 
+                    dtype=tf.float32, name='queries')
         targets = tf.placeholder(shape=[2, None], 
                 dtype=tf.int32, name='labels')
         masks = tf.placeholder(shape=[2, None, None] , 
@@ -66,18 +87,38 @@ class MatchLSTM():
         placeholders['queries'] = queries
         placeholders['targets'] = targets
         placeholders['masks'] = masks
+        if self.share_passages:
+            pidx = tf.placeholder(shape=[None], dtype=tf.int32, name='pidx')
+            placeholders['pidx'] = pidx
         placeholders['dropout'] = dropout
 
         # hidden dim
         d= self.d
 
+        # embed token ids
+        #  glove is shared by all copies of model
+        if self.vocab_size:
+            glove = tf.get_variable('glove', initializer=self.emb_init, 
+                    trainable=False)
+            passages_emb = tf.nn.embedding_lookup(glove, passages)
+            queries_emb = tf.nn.embedding_lookup(glove, queries)
+        else:
+            passages_emb, queries_emb = passages, queries
+
         # LSTM Preprocessing Layer
         with tf.variable_scope('passage'):
             pcell = rcell('lstm', num_units=d, dropout=dropout)
-            _, pstates = uni_net_dynamic(cell=pcell, inputs=passages, proj_dim=d)
+            _, pstates = uni_net_dynamic(cell=pcell, inputs=passages_emb, proj_dim=d)
+
+        # encoded once per unique passage
+        #  -> copy states to questions [L, B, d]
+        if self.share_passages:
+            pstates = tf.transpose(tf.gather(tf.transpose(pstates, [1,0,2]), pidx),
+                    [1,0,2], name='pstates_per_question')
+
         with tf.variable_scope('query'):
             qcell = rcell('lstm', d, dropout=dropout)
-            _, qstates = uni_net_dynamic(cell=qcell, inputs=queries, proj_dim=d)
+            _, qstates = uni_net_dynamic(cell=qcell, inputs=queries_emb, proj_dim=d)
 
 
         # Match-LSTM Layer
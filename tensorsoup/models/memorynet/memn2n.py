@@ -5,6 +5,7 @@ import sys
 sys.path.append('../../')
 
 from sanity import *
+from pipeline import placeholder
 from models.memorynet.modules import *
 
 from collections import OrderedDict
@@ -14,7 +15,9 @@ class MemoryNet(object):
 
     def __init__(self, hdim, num_hops, 
             memsize, sentence_size, qlen, 
-            vocab_size, num_candidates):
+            vocab_size, num_candidates,
+            multistep=False, # K steps per sess.run (see below)
+            inputs=None): # Pipeline.tensors
 
         # reset graph
         tf.reset_default_graph()
@@ -25,28 +28,30 @@ class MemoryNet(object):
         # num of copies of model (for multigpu training)
         self.n = 1
 
-        #optimizer = tf.train.AdamOptimizer(learning_rate=lr)
-
-        def inference():
-
-            with tf.name_scope('input'):
-                # build placeholders
-                questions = tf.placeholder(tf.int32, shape=[None, qlen], 
-                                           name='questions' )
-                stories = tf.placeholder(tf.int32, shape=[None, memsize, sentence_size],
-                                         name='stories' )
-
-                answers = tf.placeholder(tf.int32, shape=[None, ],
-                                         name='answers' )
-                # default placeholders
-                mode = tf.placeholder(tf.int32, shape=[], name='mode')
-                lr = tf.placeholder(tf.float32, shape=[], name='lr')
-                
-            # expose handle to placeholders
-            placeholders = OrderedDict()
-            placeholders['questions'] = questions
-            placeholders['stories'] = stories
-            placeholders['answers'] = answers
+        with tf.name_scope('input'):
+            # build placeholders
+            #  (default to pipeline tensors if given)
+            questions = placeholder(tf.int32, shape=[None, qlen], 
+                                    name='questions', inputs=inputs)
+            stories = placeholder(tf.int32, shape=[None, memsize, sentence_size],
+                                  name='stories', inputs=inputs)
+
+            answers = placeholder(tf.int32, shape=[None, ],
+                                  name='answers', inputs=inputs)
+            # default placeholders
+            mode = tf.placeholder(tf.int32, shape=[], name='mode')
+            lr = tf.placeholder(tf.float32, shape=[], name='lr')
+            
+        # expose handle to placeholders
+        placeholders = OrderedDict()
+        placeholders['questions'] = questions
+        placeholders['stories'] = stories
+        placeholders['answers'] = answers
+
+        # one optimizer -> slots shared by single and multistep training
+        optimizer = tf.train.AdamOptimizer(learning_rate=lr)
+
+        def inference(stories, questions, answers):
 
             # inject noise to memories
             dropout = tf.random_uniform([memsize, 1], 0, 1) > 0.1
@@ -134,26 +139,55 @@ class MemoryNet(object):
                 correct_labels = tf.equal(tf.cast(answers, tf.int64), tf.argmax(probs, axis=-1))
                 accuracy = tf.reduce_mean(tf.cast(correct_labels, tf.float32))
 
-            with tf.name_scope('optimization'):
-                # gradient clipping
-                optimizer = tf.train.AdamOptimizer(learning_rate=lr)
-                #optimizer = tf.train.GradientDescentOptimizer(learning_rate=lr)
-                gvs = optimizer.compute_gradients(loss)
-                clipped_gvs = [(tf.clip_by_norm(grad, 40.), var) for grad, var in gvs]
-                self.train_op = optimizer.apply_gradients(clipped_gvs)
-
-            self.loss = tf.reduce_mean(loss)
-            self.accuracy = accuracy
-            self.stories = stories
-            self.questions = questions
-            self.answers = answers
-            self.mode = mode
-            self.lr = lr
-            
-            self.placeholders = [stories, questions, answers]
-
-
-        inference()
+            return loss, accuracy
+
+        def optimize(loss):
+            # gradient clipping
+            #optimizer = tf.train.GradientDescentOptimizer(learning_rate=lr)
+            gvs = optimizer.compute_gradients(loss)
+            clipped_gvs = [(tf.clip_by_norm(grad, 40.), var) for grad, var in gvs]
+            return optimizer.apply_gradients(clipped_gvs)
+
+        loss, accuracy = inference(stories, questions, answers)
+
+        with tf.name_scope('optimization'):
+            self.train_op = optimize(loss)
+
+        self.loss = tf.reduce_mean(loss)
+        self.accuracy = accuracy
+        self.stories = stories
+        self.questions = questions
+        self.answers = answers
+        self.mode = mode
+        self.lr = lr
+        
+        self.placeholders = [stories, questions, answers]
+
+        # K training steps in one sess.run
+        #  K batches are staged as [K, batch_size, ...] and
+        #   a while loop runs inference + update on each in turn
+        if multistep:
+            with tf.name_scope('multistep'):
+                staged = [ tf.placeholder(p.dtype, shape=[None] + p.shape.as_list(),
+                    name=p.op.name.split('/')[-1]) for p in self.placeholders ]
+                num_steps = tf.shape(staged[0])[0]
+
+                def step(k, losses):
+                    # same params as single step graph
+                    with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+                        loss, _ = inference(*[ s[k] for s in staged ])
+                    train_op = optimize(loss)
+                    # next step reads updated params
+                    with tf.control_dependencies([train_op]):
+                        return k+1, losses.write(k, tf.reduce_mean(loss))
+
+                _, losses = tf.while_loop(lambda k, losses : k < num_steps, step,
+                        [ tf.constant(0), tf.TensorArray(tf.float32, size=num_steps) ],
+                        parallel_iterations=1)
+
+            # per-step losses
+            self.multistep_losses = losses.stack()
+            self.multistep_placeholders = staged
 
 
     def position_encoding(self, slen, embedding_size):
@@ -14,6 +14,8 @@ class Model(object):
             optimizer=tf.train.AdamOptimizer,
             lr=0.001,
             GPUs = [0],
+            device='gpu', # 'cpu' -> towers on /cpu:<id> (see multigpu.cpu_config)
+            accumulate=False, # gradient accumulation ops
             *args, **kwargs):
 
         # clear global tf.graph
@@ -21,9 +23,11 @@ class Model(object):
 
         self.n = n # num of copies of graph
         self.GPUs = GPUs
+        self.device = device
         self._graph = _graph # handle to custom Graph class
         self.optimizer = optimizer(lr)
         self.dformat = dformat
+        self.accumulate = accumulate
         
         self.make(*args, **kwargs)
 
@@ -52,6 +56,9 @@ class Model(object):
         self.loss = g.loss
         self.accuracy = g.accuracy
         self.prob = g.prob
+        # default placeholders
+        self.mode = g.mode
+        self.lr = g.lr
 
         # get placeholders
         self.placeholders = [ g.placeholders[k] for k in self.dformat ]
@@ -64,13 +71,13 @@ class Model(object):
 
         # keep track of placholder and gradients
         tower_grads, ph_list, losses, accuracies = [], [], [], []
-        probs = []
+        probs, modes, lrs = [], [], []
 
         with tf.variable_scope(tf.get_variable_scope()):
             # iterate through list of GPUs
             for i,GPU_ in enumerate(self.GPUs):
                 # for each GPU[i]
-                with tf.device('/gpu:{}'.format(GPU_)):
+                with tf.device('/{}:{}'.format(self.device, GPU_)):
                     # create n/m copies per GPU
                     for j in range(self.n//len(self.GPUs)):
                         # separate name scope for each copy
@@ -97,6 +104,9 @@ class Model(object):
                             accuracies.append(g.accuracy)
                             # and probabilities
                             probs.append(g.prob)
+                            # default placeholders of tower
+                            modes.append(g.mode)
+                            lrs.append(g.lr)
         # in CPU:0
         with tf.device('/cpu:0'):
             # average gradients in cpu
@@ -107,6 +117,8 @@ class Model(object):
             self.prob = tf.reduce_mean(tf.stack(probs), axis=0)
             # handle to placeholders list[list]
             self.placeholders = ph_list
+            self.mode = modes
+            self.lr = lrs
 
 
     def optimize(self, clip_norm=10.):
@@ -116,6 +128,56 @@ class Model(object):
                     for grad, var in self.grads]
             self.train_op = self.optimizer.apply_gradients(clipped_gvs)
 
+            if self.accumulate:
+                self.accumulate_gradients(clip_norm)
+
+    def accumulate_gradients(self, clip_norm=10.):
+        '''
+            gradients summed over micro-batches
+
+             accumulate_op adds gradients of current batch
+              to (non-trainable) accumulators;
+             apply_op applies their mean and resets them
+
+             peak memory is that of one micro-batch;
+              accumulators are global variables, so they are
+               initialized and checkpointed with the model
+
+            [usage]
+            for batch in micro_batches:
+                sess.run(model.accumulate_op, feed_dict)
+            sess.run(model.apply_op)
+
+        '''
+        grads = [ (grad, var) for grad, var in self.grads if grad is not None ]
+        with tf.name_scope('accumulate'):
+            self.accumulators = [ tf.Variable(tf.zeros(var.shape, var.dtype),
+                trainable=False, name=var.op.name.replace('/', '_'))
+                for _, var in grads ]
+            # num of micro-batches accumulated
+            self.accumulated = tf.Variable(0., trainable=False, name='count')
+
+            updates = []
+            for acc, (grad, _) in zip(self.accumulators, grads):
+                # sparse updates for embeddings
+                if isinstance(grad, tf.IndexedSlices):
+                    updates.append(tf.scatter_add(acc, grad.indices, grad.values))
+                else:
+                    updates.append(tf.assign_add(acc, grad))
+            updates.append(tf.assign_add(self.accumulated, 1.))
+            self.accumulate_op = tf.group(*updates)
+
+            # mean gradient -> clip -> apply
+            count = tf.maximum(self.accumulated, 1.)
+            apply_op = self.optimizer.apply_gradients([ 
+                (tf.clip_by_norm(acc/count, clip_norm), var) 
+                for acc, (_, var) in zip(self.accumulators, grads) ])
+
+            # reset after update
+            with tf.control_dependencies([apply_op]):
+                self.apply_op = tf.group(*[ tf.assign(acc, tf.zeros_like(acc)) 
+                    for acc in self.accumulators + [self.accumulated] ])
+
 
 
 if __name__ == '__main__':
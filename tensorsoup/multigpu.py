@@ -55,6 +55,13 @@ def make_parallel(model, num_copies, num_gpus):
     return 
 
 
+def cpu_config(num_cpus):
+    # expose num_cpus CPU devices (/cpu:0 .. /cpu:<num_cpus-1>)
+    #  -> towers of Model(device='cpu') run on separate devices
+    return tf.ConfigProto(device_count={ 'CPU' : num_cpus },
+            allow_soft_placement=True)
+
+
 # from cifar10 multi-gpu example
 #  https://github.com/tensorflow/models/blob/master/tutorials/image/cifar10/cifar10_multi_gpu_train.py
 def average_gradients(tower_grads):
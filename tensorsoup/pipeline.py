@@ -0,0 +1,125 @@
+import numpy as np
+import tensorflow as tf
+
+from datafeed import DataFeed
+
+
+class Pipeline(object):
+    '''
+        in-graph input pipeline over a feed
+
+         batches of the fields in 'dformat' are served by a
+          tf.data.Dataset and prefetched in the runtime; graphs
+           built with 'inputs=pipeline' read the next batch on
+            every sess.run, with no feed_dict
+
+          [1] DataFeed over arrays -> batches of (shuffled) row
+               indices gather rows in graph (arrays are copied in
+                once, when the iterator is initialized)
+          [2] other feeds (BucketFeed, ..) -> batches are pulled
+               from feed.next_batch by a generator
+
+         model placeholders default to the pipeline tensors, so
+          they still take a feed_dict (evaluation, debugging)
+
+         'names' maps fields to placeholder names,
+          when they differ from dformat ('contexts' -> 'stories')
+
+         tensors are built on first use, in the graph of the
+          model (models reset the default graph); the pipeline
+           runs ahead of training, feed position is not checkpointed
+
+        [usage]
+        pipeline = Pipeline(trainfeed, batch_size=32,
+            names=['stories', 'questions', 'answers'])
+        model = MemoryNet(..., inputs=pipeline)
+        trainer = Trainer(sess, model, pipeline, testfeed, batch_size=32)
+
+    '''
+    def __init__(self, feed, batch_size, names=None, size=4):
+        self.feed = feed
+        self.batch_size = batch_size
+        self.names = names if names else feed.dformat
+        self.size = size
+
+        # plain feed over arrays -> slice in graph
+        self.arrays = None
+        if type(feed) is DataFeed and all( 
+                isinstance(feed.data[k], np.ndarray) for k in feed.dformat ):
+            self.arrays = [ feed.data[k] for k in feed.dformat ]
+            self.first = self.arrays
+        else:
+            # first batch -> dtype, rank of fields
+            #  (served first by generator)
+            self.first = [ np.asarray(field) 
+                    for field in feed.next_batch(batch_size) ]
+
+        self.graph = None
+        self.session = None
+        self.tensors = {}
+
+    def batches(self):
+        yield tuple(self.first)
+        while True:
+            yield tuple( np.asarray(field) 
+                    for field in self.feed.next_batch(self.batch_size) )
+
+    def build(self):
+        dtypes = tuple( tf.as_dtype(field.dtype) for field in self.first )
+        with tf.name_scope('pipeline'):
+            if self.arrays is not None:
+                self.sources = [ tf.placeholder(dtype, field.shape) 
+                        for dtype, field in zip(dtypes, self.arrays) ]
+                # batches of row indices -> gather rows
+                n = self.feed.getN()
+                dataset = tf.data.Dataset.range(n)
+                if self.feed.shuffle:
+                    dataset = dataset.shuffle(n)
+                # incomplete batch at end of epoch is dropped (as in DataFeed)
+                dataset = dataset.batch(self.batch_size, 
+                        drop_remainder=True).repeat()
+                dataset = dataset.map(lambda idx : tuple( tf.gather(source, idx)
+                    for source in self.sources ))
+            else:
+                dataset = tf.data.Dataset.from_generator(self.batches,
+                        output_types=dtypes,
+                        output_shapes=tuple( tf.TensorShape([None]*field.ndim)
+                            for field in self.first ))
+            # keep 'size' batches ready
+            dataset = dataset.prefetch(self.size)
+            self.iterator = dataset.make_initializable_iterator()
+
+            # name -> next batch of field
+            self.tensors = dict(zip(self.names, self.iterator.get_next()))
+        self.graph = tf.get_default_graph()
+        self.session = None
+
+    def initialize(self, sess):
+        # once per session
+        if sess is self.session:
+            return
+        feed_dict = dict(zip(self.sources, self.arrays)) if self.arrays is not None else None
+        sess.run(self.iterator.initializer, feed_dict=feed_dict)
+        self.session = sess
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        if self.graph is not tf.get_default_graph():
+            self.build()
+        return self.tensors[name]
+
+    def getN(self):
+        return self.feed.getN()
+
+
+def placeholder(dtype, shape, name, inputs=None):
+    '''
+        placeholder(dtype, shape, str : name, dict : inputs) -> tensor
+            placeholder that defaults to inputs[name] (Pipeline or dict)
+    '''
+    if inputs and name in inputs:
+        return tf.placeholder_with_default(tf.cast(inputs[name], dtype),
+                shape, name=name)
+    return tf.placeholder(dtype, shape, name=name)
@@ -4,52 +4,88 @@ from itertools import chain
 from six.moves import range, reduce
 from pprint import pprint
 from tasks.babi.proc import load_task, vectorize_data
+from datafeed import Prefetcher
+from tproc import store
 
 import os
 import pickle
 
+from collections import OrderedDict
+
+
+DTYPES = [ 'train', 'test' ]
+
+# store split of task
+task_split = lambda task_id, dtype : 'task{}.{}'.format(task_id, dtype)
+
 
 class DataSourceAllTasks(object):
+    '''
+        tasks 1-20 vectorized with a joint vocabulary,
+         plus task 0 (all tasks joined)
+
+        each task is a split in a columnar store, loaded 
+         (memory-mapped) on first access; at most 'max_tasks' 
+          tasks stay resident, least recently used are dropped
+
+        task 0 is not stored; it is a shuffled index
+         over the rows of tasks 1-20 (redrawn every epoch);
+          its batches touch every task, so all 20 stay resident
+
+    '''
      
-    def __init__(self, datadir, task_id=0, batch_size=128):
+    def __init__(self, datadir, task_id=0, batch_size=128, max_tasks=4):
 
         self.datadir = datadir
         self.batch_size = batch_size
         self.task_id = task_id
+        # LRU bound of single tasks
+        #  (task 0 -> all 20, see max_tasks)
+        self.lru_size = max_tasks
 
         # current iteration
         self.i = [0]*21
+
+        # per-task store
+        self.path = datadir + '/store.tasks'
         
-        #if os.path.isfile(datadir + '/data.train'):
-        # load data
-        data_all, metadata  = self.fetch()
+        # process data (first run) and load metadata
+        metadata = self.fetch()
             
-        print('data fetched for {} tasks'.format(len(data_all['trS'])))
         print('** metadata')
         pprint(metadata)
         self.metadata = metadata
 
-        self.data = [{}]*21
-        self.n = [{}]*21
-        for task_id in range(21):
-            self.data[task_id] = {}
-
-            # convenience dict
-            self.data[task_id]['train'] = [ data_all['trS'][task_id],
-                                            data_all['trQ'][task_id],
-                                            data_all['trA'][task_id] ]
-            self.data[task_id]['test'] = [ data_all['teS'][task_id],
-                                           data_all['teQ'][task_id],
-                                           data_all['teA'][task_id] ]
+        # num of examples
+        #  read from store manifest (data is not loaded)
+        #  (kept, to load splits without re-reading it)
+        self.manifest = manifest = store.manifest(self.path)
+        self.n = [ {} for _ in range(21) ]
+        for task_id in range(1, 21):
+            for dtype in DTYPES:
+                split = task_split(task_id, dtype)
+                self.n[task_id][dtype] = manifest[split]['S']['shape'][0]
+
+        # task 0 -> index over rows of tasks 1-20
+        self.offsets, self.perm = {}, {}
+        for dtype in DTYPES:
+            counts = [ self.n[task_id][dtype] for task_id in range(1, 21) ]
+            self.offsets[dtype] = np.concatenate([[0], np.cumsum(counts)])
+            self.n[0][dtype] = int(self.offsets[dtype][-1])
+            self.perm[dtype] = np.random.permutation(self.n[0][dtype])
+
+        # resident tasks (LRU)
+        self.tasks = OrderedDict()
+
+        print('built data loader for 21 tasks -- datalen={},{}'
+              .format(self.n[0]['train'], self.n[0]['test']))
             
-            # num of examples
-            self.n[task_id] = {}
-            self.n[task_id]['train'] = len(self.data[task_id]['train'][0])
-            self.n[task_id]['test']  = len(self.data[task_id]['test'][0])
 
-            print('built data loader for task_id={} -- datalen={},{}'
-                  .format(task_id, self.n[task_id]['train'], self.n[task_id]['test'] ))
-            
+    @property
+    def max_tasks(self):
+        # task 0 -> batches span all tasks
+        #  (follows task_id, when switched later)
+        return 20 if self.task_id == 0 else self.lru_size
 
     def getN(self, dtype='train'):
         return self.n[self.task_id][dtype]
@@ -57,54 +93,96 @@ class DataSourceAllTasks(object):
     def setI(self, val = 0, dtype='train'):
         self.i[self.task_id]= val
 
+
+    '''
+        get data of task (1-20)
+         load on first access, evict least recently used
+
+    '''
+    def task(self, task_id):
+        if task_id in self.tasks:
+            self.tasks.move_to_end(task_id)
+            return self.tasks[task_id]
+
+        data = {}
+        for dtype in DTYPES:
+            split = task_split(task_id, dtype)
+            fields = store.load_split(self.path, split, 
+                    entries=self.manifest[split])
+            data[dtype] = [ fields['S'], fields['Q'], fields['A'] ]
+        self.tasks[task_id] = data
+
+        while len(self.tasks) > self.max_tasks:
+            self.tasks.popitem(last=False)
+
+        return data
+
+
+    '''
+        gather rows of task 0 (joined tasks)
+
+    '''
+    def gather(self, idx, dtype='train'):
+        # global index -> (task, row)
+        offsets = self.offsets[dtype]
+        task_ids = np.searchsorted(offsets, idx, side='right')
+        rows = idx - offsets[task_ids-1]
+
+        # allocate from manifest (shape, dtype of fields)
+        entries = self.manifest[task_split(1, dtype)]
+        batch = [ np.empty((len(idx),) + tuple(entries[k]['shape'][1:]),
+                    dtype=entries[k]['dtype']) for k in 'SQA' ]
+        for task_id in np.unique(task_ids):
+            selected = task_ids == task_id
+            for j, d in enumerate(self.task(int(task_id))[dtype]):
+                batch[j][selected] = d[rows[selected]]
+
+        return batch
+
     
     def batch(self, i, dtype='train'):
         # fetch 'i'th batch
         s, e = self.batch_size * i, (i+1)* self.batch_size
-        return [ d[s:e] for d in self.data[self.task_id][dtype] ]
+        if self.task_id == 0:
+            return self.gather(self.perm[dtype][s:e], dtype)
+        return [ d[s:e] for d in self.task(self.task_id)[dtype] ]
 
     def next_batch(self, n, dtype='train'):
         bi = self.batch(self.i[self.task_id], dtype=dtype)
-        if self.i[self.task_id] < self.n[self.task_id][dtype]//self.batch_size:
-            self.i[self.task_id] = self.i[self.task_id] + 1
+        i = self.i[self.task_id] + 1
+        # wrap before an empty or partial batch
+        if (i+1)*self.batch_size <= self.n[self.task_id][dtype]:
+            self.i[self.task_id] = i
         else:
             self.i[self.task_id] = 0
+            # task 0 -> new order every epoch
+            if self.task_id == 0:
+                self.perm[dtype] = np.random.permutation(self.n[0][dtype])
         return bi
 
+    def prefetch(self, size=4, dtype='train'):
+        # prepare next batches of current task in background
+        return Prefetcher(lambda : self.next_batch(1, dtype=dtype),
+                n=self.getN(dtype), size=size, batch_size=self.batch_size)
+
     def fetch(self):
 
         # if processed files exist
-        #   read pickle and return
-        dataf = self.datadir + '/data.pickle'
+        #   read metadata and return
         metaf = self.datadir + '/metadata.pickle'
 
-        if os.path.isfile(dataf) and os.path.isfile(metaf):
-            print(':: <gather> [1/2] Reading from' , dataf)
-            with open(dataf, 'rb') as handle:
-                data = pickle.load(handle)
-            print(':: <gather> [2/2] Reading from' , metaf)
+        if store.exists(self.path) and os.path.isfile(metaf):
+            print(':: <gather> [1/1] Reading from' , metaf)
             with open(metaf, 'rb') as handle:
                 metadata = pickle.load(handle)
-            return data, metadata
+            return metadata
 
-        def load_all_tasks(data_dir):
-            train_data, test_data = [], []
-            for i in range(1,21):
-                train, test = load_task(data_dir, i)
-                train_data.extend(train)
-                test_data.extend(test)
-
-            random.shuffle(train_data)
-            random.shuffle(test_data)
-            
-            return train_data, test_data
-        
         # data directory
         datadir = self.datadir #+ '/en-10k/'
-        # task data
+        # task data (each task read once)
+        tasks = [ load_task(datadir, task_id) for task_id in range(1, 21) ]
         
-        train, test = load_all_tasks(datadir)
-        data = train + test
+        data = [ item for train, test in tasks for item in train + test ]
         print('** data len', len(data))
 
         # metadata
@@ -120,48 +198,13 @@ class DataSourceAllTasks(object):
         vocab_size = len(word_idx) + 1 # +1 for nil word
         sentence_size = max(query_size, sentence_size) # for the position
 
-
-        train_tasks, test_tasks = [{}]*21, [{}]*21
-        trainS, trainQ, trainA = [{}]*21, [{}]*21, [{}]*21
-        testS, testQ, testA = [{}]*21, [{}]*21, [{}]*21
-        n_train, n_test = [{}]*21, [{}]*21
-
-        task_id = 0
-        # train/test sets
-        trainS[task_id], trainQ[task_id], trainA[task_id] = vectorize_data(train, word_idx, sentence_size, memory_size)
-        testS[task_id], testQ[task_id], testA[task_id] = vectorize_data(test, word_idx, sentence_size, memory_size)
-        
-        # params
-        n_train[task_id] = trainS[task_id].shape[0]
-        n_test[task_id] = testS[task_id].shape[0]
-        
-        
-        for task_id in range(1, 21):
-            train_tasks[task_id], test_tasks[task_id] = load_task(datadir, task_id)
-        
-            # train/test sets
-            trainS[task_id], trainQ[task_id], trainA[task_id] = vectorize_data(train_tasks[task_id], word_idx, sentence_size, memory_size)
-            testS[task_id], testQ[task_id], testA[task_id] = vectorize_data(test_tasks[task_id], word_idx, sentence_size, memory_size)
-            
-            # params
-            n_train[task_id] = trainS[task_id].shape[0]
-            n_test[task_id] = testS[task_id].shape[0]
-
-        task_id = 0
-        batches = zip(range(0, n_train[task_id]-self.batch_size, self.batch_size), 
-                range(self.batch_size, n_train[task_id], self.batch_size))
-        batches = [(start, end) for start, end in batches]
-
-        data = {
-            'trS' : trainS,
-            'trQ' : trainQ,
-            'trA' : trainA,
-            'teS' : testS,
-            'teQ' : testQ,
-            'teA' : testA,
-            'batches' : batches
-            }
-
+        # vectorize each task with joint vocabulary
+        #  -> one split per task and dtype
+        splits = {}
+        for task_id, (train, test) in enumerate(tasks, 1):
+            for dtype, task_data in zip(DTYPES, [train, test]):
+                S, Q, A = vectorize_data(task_data, word_idx, sentence_size, memory_size)
+                splits[task_split(task_id, dtype)] = { 'S' : S, 'Q' : Q, 'A' : A }
 
         metadata = {
                 'vocab_size' : vocab_size,
@@ -171,13 +214,12 @@ class DataSourceAllTasks(object):
                 'memory_size' : memory_size
                 }
 
-        with open(datadir + '/data.pickle', 'wb') as handle:
-            pickle.dump(data, handle, pickle.HIGHEST_PROTOCOL)
+        store.save(self.path, splits)
 
-        with open(datadir + '/metadata.pickle', 'wb') as handle:
+        with open(metaf, 'wb') as handle:
             pickle.dump(metadata, handle, pickle.HIGHEST_PROTOCOL)
 
-        return data, metadata
+        return metadata
 
 
 class DataSource(object):
@@ -222,6 +264,14 @@ class DataSource(object):
             self.i = 0
         return bi
 
+    def getN(self, dtype='train'):
+        return self.n[dtype]
+
+    def prefetch(self, size=4, dtype='train'):
+        # prepare next batches in background
+        return Prefetcher(lambda : self.next_batch(1, dtype=dtype),
+                n=self.n[dtype], size=size, batch_size=self.batch_size)
+
     def fetch(self):
            
         def load_all_tasks(data_dir):
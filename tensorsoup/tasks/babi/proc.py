@@ -1,10 +1,15 @@
+import glob
+import hashlib
 import os
 import sys
 import pickle
 
+from multiprocessing import Pool
+
 sys.path.append('../../')
 
 from tproc.utils import *
+from tproc import store
 
 
 DATA_DIR_1K = '../../../datasets/babi/en/'
@@ -61,20 +66,21 @@ def process_file(filename):
             s = [int(i) for i in s]
             _support = []
             for j in s:
-                for i, line in enumerate(local_context):
-                    index = int(line.split(' ')[0])
-                    if j == index:
-                        if debug:
-                            _support.append((i, j))
-                        else:
-                            _support.append(i)
-                        break
+                # position of line 'j' in local context
+                if j in positions:
+                    i = positions[j]
+                    if debug:
+                        _support.append((i, j))
+                    else:
+                        _support.append(i)
 
             return _support
         
         contexts, questions, answers, supports = [], [], [], []
 
         local_context = []
+        # line index -> position in local context
+        positions = {}
         sample_dict  = {}
         for line in sample:
             index = line.split(' ')[0]
@@ -98,6 +104,7 @@ def process_file(filename):
                 # add words to list
                 words.extend(sanitize(line).split(' '))
                 # add line to current context
+                positions[int(index)] = len(local_context)
                 local_context.append(line)
 
         contexts = [[sanitize(s) for s in context] for context in contexts]
@@ -176,7 +183,59 @@ def index(data, metadata):
     return indexed_data
 
 
-def process(path, dtype, serialize=True):
+def file_hash(*filenames):
+    h = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def process_task(tid, testfile, trainfile):
+    # process train and test files
+    struc_text_test = process_file(testfile)
+    struc_text_train = process_file(trainfile)
+
+    # get metadata
+    metadata = gather_metadata(struc_text_train, 
+            struc_text_test)
+
+    # index structured text
+    return {
+            'train' : index(struc_text_train, metadata),
+            'test'  : index(struc_text_test , metadata),
+            'metadata' : metadata,
+            # structured text -> joined tasks
+            'text' : { TRAIN : struc_text_train, TEST : struc_text_test }
+            }
+
+
+def process_task_cached(args):
+    '''
+        process_task_cached((tid, testfile, trainfile, cache_dir)) -> dict
+            cached on disk, keyed by hash of task files;
+             a changed task file reprocesses that task only
+    '''
+    tid, testfile, trainfile, cache_dir = args
+    cachef = '{}/task{}.{}'.format(cache_dir, tid, 
+            file_hash(testfile, trainfile)[:16])
+
+    if os.path.isfile(cachef):
+        with open(cachef, 'rb') as handle:
+            return pickle.load(handle)
+
+    task = process_task(tid, testfile, trainfile)
+
+    # drop stale entries of task
+    for stale in glob.glob('{}/task{}.*'.format(cache_dir, tid)):
+        os.remove(stale)
+    with open(cachef, 'wb') as handle:
+        pickle.dump(task, handle, pickle.HIGHEST_PROTOCOL)
+
+    return task
+
+
+def process(path, dtype, serialize=True, workers=None):
 
     # get list of files
     #  sort files based on name (task id)
@@ -188,6 +247,21 @@ def process(path, dtype, serialize=True):
     # get test and train files given task id
     get_files_by_task = lambda tid : files[(tid-1)*2 : (tid-1)*2 + 2]
 
+    # per-task cache
+    cache_dir = '{}/cache.{}'.format(path, dtype)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    # process 20 tasks
+    #  in a pool of worker processes
+    jobs = [ (i,) + tuple(get_files_by_task(i)) + (cache_dir,) 
+            for i in range(1, 21) ]
+    if workers == 1:
+        tasks = list(map(process_task_cached, jobs))
+    else:
+        with Pool(workers) as pool:
+            tasks = pool.map(process_task_cached, jobs)
+
     # init data dict 
     #  that holds separate and joined tasks
     data = {
@@ -195,56 +269,66 @@ def process(path, dtype, serialize=True):
             'test'  : { k:[] for k in KEYS }
             }
 
-    # process 20 tasks
-    struc_texts_test = [] # plural -> list
-    for i in range(1, 21):
-        # process train and test files
-        testfile, trainfile = get_files_by_task(i)
-        struc_text_test = process_file(testfile)
-        struc_text_train = process_file(trainfile)
-
-        # get metadata
-        metadata = gather_metadata(struc_text_train, 
-                struc_text_test)
-
-        # append to list (to be used later)
-        struc_texts_test.append(struc_text_test)
-
-        # index structured text
-        data[i] = {
-                'train' : index(struc_text_train, metadata),
-                'test'  : index(struc_text_test , metadata),
-                'metadata' : metadata
-                }
+    # combine text data
+    #  note down range of each task in joined test set
+    bounds = [0]
+    for i, task in enumerate(tasks, 1):
+        for tag in TAGS:
+            for k in KEYS:
+                data[tag][k].extend(task['text'][tag][k])
+        bounds.append(len(data['test']['questions']))
 
-        # combine text data
-        for k in KEYS:
-            data['train'][k].extend(struc_text_train[k])
-            data['test'][k].extend(struc_text_test[k])
+        data[i] = { k : task[k] for k in ['train', 'test', 'metadata'] }
 
     # gather metadata for joined tasks
     metadata = gather_metadata(data['train'], data['test'])
 
-    # index combined data
+    # index combined data (once)
     for tag in TAGS:
         data[tag] = index(data[tag], metadata)
 
     # add test set separate tasks to data['test']
-    #  reindex individual tasks data
+    #  slices of combined test set (global metadata)
     for j in range(1, 21):
-        # reindex with global metadata
-        data['test'][j] = index(struc_texts_test[j-1], metadata)
+        s, e = bounds[j-1], bounds[j]
+        data['test'][j] = { k : data['test'][k][s:e] 
+                for k in [ 'contexts', 'questions', 'answers', 'supports' ] }
 
     if serialize:
         print(':: [1/1] Serialize data and metadata')
-        with open('{}/data.{}'.format(path, dtype), 'wb') as handle:
-            pickle.dump(data, handle, pickle.HIGHEST_PROTOCOL)
+        store.save('{}/store.{}'.format(path, dtype), to_splits(data))
         with open('{}/metadata.{}'.format(path, dtype), 'wb') as handle:
             pickle.dump(metadata, handle, pickle.HIGHEST_PROTOCOL)
+        with open('{}/metadata.{}.tasks'.format(path, dtype), 'wb') as handle:
+            pickle.dump({ i : data[i]['metadata'] for i in range(1, 21) },
+                    handle, pickle.HIGHEST_PROTOCOL)
 
     return data, metadata
 
 
+# nested data -> flat splits for columnar store
+#  'train', 'test', 'test.<j>', '<i>.train', '<i>.test'
+def to_splits(data):
+    splits = {}
+    for tag in TAGS:
+        splits[tag] = { k:v for k,v in data[tag].items() if k in KEYS }
+    for i in range(1, 21):
+        splits['test.{}'.format(i)] = data['test'][i]
+        for tag in TAGS:
+            splits['{}.{}'.format(i, tag)] = data[i][tag]
+    return splits
+
+
+# flat splits -> nested data
+def from_splits(splits, tasks_metadata):
+    data = { tag : splits[tag] for tag in TAGS }
+    for i in range(1, 21):
+        data['test'][i] = splits['test.{}'.format(i)]
+        data[i] = { tag : splits['{}.{}'.format(i, tag)] for tag in TAGS }
+        data[i]['metadata'] = tasks_metadata[i]
+    return data
+
+
 def gather(dtype, task=0):
 
     path = {
@@ -254,11 +338,23 @@ def gather(dtype, task=0):
 
     # build file names
     dataf = '{}/data.{}'.format(path[dtype], dtype)
+    storef = '{}/store.{}'.format(path[dtype], dtype)
     metadataf = '{}/metadata.{}'.format(path[dtype], dtype)
 
+    # if columnar store exists
+    #  memory-map data
+    if store.exists(storef) and os.path.isfile(metadataf):
+        print(':: <gather> [1/2] Mapping' , storef)
+        splits = store.load(storef)
+        print(':: <gather> [2/2] Reading from' , metadataf)
+        with open(metadataf, 'rb') as handle:
+            metadata = pickle.load(handle)
+        with open(metadataf + '.tasks', 'rb') as handle:
+            data = from_splits(splits, pickle.load(handle))
+
     # if processed files exist
     #  read pickle and return
-    if os.path.isfile(dataf) and os.path.isfile(metadataf):
+    elif os.path.isfile(dataf) and os.path.isfile(metadataf):
         print(':: <gather> [1/2] Reading from' , dataf)
         with open(dataf, 'rb') as handle:
             data = pickle.load(handle)
@@ -303,8 +399,8 @@ def pad(data, metadata):
         'supports' : np.array(data['supports'])
         }
 
-    # TODO : separate shuffle from pad
-    return shuffle(padded_data)
+    # shuffling is left to DataFeed (per epoch)
+    return padded_data
 
 
 
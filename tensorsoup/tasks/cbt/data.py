@@ -5,6 +5,7 @@ import sys
 sys.path.append('../../')
 
 import tasks.cbt.proc as proc
+from datafeed import Prefetcher
 
 
 class DataSource(object):
@@ -49,6 +50,12 @@ class DataSource(object):
         return bi
 
 
+    def prefetch(self, size=4, dtype='train'):
+        # prepare next batches in background
+        return Prefetcher(lambda : self.next_batch(dtype=dtype),
+                n=self.n[dtype], size=size, batch_size=self.batch_size)
+
+
     def fetch(self):
         data, metadata = proc.gather(path=self.datadir, 
                 tag=self.task, 
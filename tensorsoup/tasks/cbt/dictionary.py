@@ -3,17 +3,28 @@ import re
 class Dictionary(object):
     def __init__(self, i2w):
         self.i2w = i2w
+        # word -> index (first occurrence)
+        self.w2i = {}
+        for i, w in enumerate(i2w):
+            self.w2i.setdefault(w, i)
+
+    def add(self, word):
+        if word not in self.w2i:
+            self.w2i[word] = len(self.i2w)
+            self.i2w.append(word)
 
     def index(self, word):
         if self.is_worthy(word):
-            if word in self.i2w:
-                return self.i2w.index(word)
-            elif re.search('cand(\d+)', word):
-                match = re.search('cand(\d+)', word)
-                if match:
-                    return int(match.group(1))
+            if word in self.w2i:
+                return self.w2i[word]
+            match = re.search('cand(\d+)', word)
+            if match:
+                return int(match.group(1))
+
+        return self.w2i['UNK']
 
-        return self.i2w.index('UNK')
+    def index_many(self, words):
+        return [ self.index(w) for w in words ]
                 
 
     # check if a word is worthy
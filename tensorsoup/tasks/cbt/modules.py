@@ -2,16 +2,12 @@ import numpy as np
 
 # context -> paddeded numpy array [N, clen]
 # candidates -> [N, 10]
+#  mask -> [N, 10, clen]
+#   (ASReaderGraph(derive_cmask=True) builds it in graph instead)
 def candidate_mask(contexts, candidates):
-    
-    mask = []
-    for context, candidates_i in zip(contexts, candidates):
-        mask_i = []
-        for candidate in candidates_i:
-            mask_i.append(context == candidate)
-        mask.append(mask_i)
-
-    return np.array(mask, dtype=np.int32)
+    contexts, candidates = np.asarray(contexts), np.asarray(candidates)
+    return (np.expand_dims(contexts, axis=1) == 
+            np.expand_dims(candidates, axis=-1)).astype(np.int32)
 
 def reindex_answer(answer, candidates):
     return [ c.index(a) for a,c in zip(answer, candidates) ]
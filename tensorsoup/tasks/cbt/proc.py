@@ -4,6 +4,7 @@ sys.path.append('../../')
 from tasks.cbt.pipeline import *
 from tasks.cbt.modules import *
 from tproc.utils import *
+from tproc import store
 from tasks.cbt.dictionary import Dictionary
 
 from tqdm import tqdm
@@ -16,6 +17,8 @@ FIELDS = [ 'context', 'query', 'answer', 'candidates' ]
 DSETS  = [ 'test', 'valid' ]
 #DSETS  = [ 'valid' ]
 PICKLES = [ 'data.NE', 'lookup.NE', 'metadata.NE' ]
+# columnar store (replaces data.NE)
+STORE = 'store.NE'
 
 PATH = '../../../datasets/CBTest/data/'
 
@@ -43,68 +46,65 @@ def fetch_samples(path):
 
     return samples
 
+# candidate token pattern
+CAND = re.compile('cand\d+')
+
 # text sample to data item
+#  one substitution pass and one tokenize-and-index pass per sample
 def process_sample(sample, lookup, candidate_lookup):
     
-    vocab = lookup.i2w
+    lines = sample.splitlines()
     # get candidates
-    candidates = sample.splitlines()[-1].split('\t')[-1].split('|')
-    answer = sample.splitlines()[-1].split('\t')[1].strip()
+    candidates = lines[-1].split('\t')[-1].split('|')
+    answer = lines[-1].split('\t')[1].strip()
 
     # filter candidates
     candidates = [ w for w in candidates if lookup.is_worthy(w) ]
 
     # update vocab
     for w in candidates:
-        if w not in vocab and lookup.is_worthy(w):
-            vocab.append(w)
+        lookup.add(w)
 
     # add unk to candidates to keep shape at 10
     candidates = candidates + ['UNK']*(10 - len(candidates))
 
-    # build word to index
-    # w2i = { w:i for i,w in enumerate(vocab) }
-
     # assign special tokens to candidates
+    tokens = {}
     for w in candidates:
-        token_w = 'cand' + str(vocab.index(w))
-        candidate_lookup[token_w] = w
-        sample = sample.replace(w, token_w)
+        tokens.setdefault(w, 'cand' + str(lookup.w2i[w]))
+        candidate_lookup[tokens[w]] = w
 
-    #sample = rtext_pipeline(sample)
+    # substitute all candidates in a single pass
+    #  alternatives keep candidate order, so an earlier candidate
+    #   wins where two match at the same position
+    pattern = re.compile('|'.join([ re.escape(w) for w in tokens ]))
+    sample = pattern.sub(lambda m : tokens[m.group(0)], sample)
 
-    # update vocabulary
-    #  obtain words from string(sample)
     # split sample into story and query
-    story = ' '.join([ line.lstrip('0123456789') for line in sample.splitlines()[:-1] ])
-    query = sample.splitlines()[-1].split('\t')[0].lstrip('21')
+    lines = sample.splitlines()
+    story = ' '.join([ line.lstrip('0123456789') for line in lines[:-1] ])
+    query = lines[-1].split('\t')[0].lstrip('21')
 
     # run through raw text pipeline
     story = rtext_pipeline(story)
     query = rtext_pipeline(query)
 
+    # update vocabulary and vectorize
+    def index(words):
+        indices = []
+        for w in words:
+            if w not in lookup.w2i and not CAND.match(w):
+                lookup.add(w)
+            indices.append(lookup.index(w))
+        return indices
 
-    for w in (story + ' ' + query).split():
-        if w not in vocab:
-            if re.match('cand\d+', w):
-                continue
-            vocab.append(w)
-
-    #update the global lookup database
-    lookup.i2w = vocab
-    
-    # vectorize sample
     data = {
-            'context' : vectorize_tree(story.split(), lookup),
-            'query' : vectorize_tree(query.split(), lookup),
-            'candidates' : vectorize_tree(candidates, lookup),
-            'answer' : vectorize_tree(answer, lookup)
+            'context' : index(story.split()),
+            'query' : index(query.split()),
+            'candidates' : lookup.index_many(candidates),
+            'answer' : lookup.index(answer)
             }
 
-    # replace special tokens in vocab with actual words
-    #for token, w in candidate_lookup.items():
-    #    vocab[vocab.index(token)] = w
-
     return data, lookup, candidate_lookup
 
 
@@ -175,19 +175,17 @@ def process():
     metadata['vocab_size'] = len(lookup.i2w)
 
     # create w2i and i2w
-    w2i = { w:i for i,w in enumerate(lookup.i2w) }
-
-    lookup = { 'w2i' : w2i, 'i2w' : lookup.i2w }
+    lookup = { 'w2i' : lookup.w2i, 'i2w' : lookup.i2w }
 
     # save to disk
-    serialize(data, PATH + 'data.NE')
+    store.save(PATH + STORE, data)
     serialize(lookup, PATH + 'lookup.NE')
     serialize(metadata, PATH + 'metadata.NE')
 
     return data, lookup, metadata
 
 
-def pad_data(data, metadata, truncate=False):
+def pad_data(data, metadata, truncate=False, cmask=True):
 
     clen = metadata['clen']
     qlen = metadata['qlen']
@@ -210,23 +208,61 @@ def pad_data(data, metadata, truncate=False):
                 })
 
         # add candidate mask over context
-        padded_data[dset]['cmask'] = candidate_mask(padded_data[dset]['context'],
-                padded_data[dset]['candidates'])
+        #  (skip if model derives it in graph)
+        if cmask:
+            padded_data[dset]['cmask'] = candidate_mask(padded_data[dset]['context'],
+                    padded_data[dset]['candidates'])
 
     return padded_data
 
 
-def gather():
+# unpadded data for bucketed feeds
+#  context and query stay ragged (padded per batch)
+def ragged_data(data):
 
-    for pickle_file in PICKLES:
-        if not os.path.isfile(PATH + pickle_file):
-            data, lookup, metadata = process()
+    ragged = {}
+    for dset in DSETS:
+        ragged[dset] = {
+                'context' : data[dset]['context'],
+                'query' : data[dset]['query'],
+                'answer' : pad_seq(reindex_answer(data[dset]['answer'],
+                    data[dset]['candidates'])),
+                'candidates' : pad_seq(data[dset]['candidates'],
+                    10, truncate=True)
+                }
 
-    else:
+    return ragged
+
+
+# add candidate mask to a padded batch
+#  (transform for BucketFeed)
+def batch_cmask(batch):
+    batch['cmask'] = candidate_mask(batch['context'], batch['candidates'])
+    return batch
+
+
+def gather(pad=True, cmask=True):
+
+    processed = [ os.path.isfile(PATH + pfile) for pfile in PICKLES[1:] ]
+
+    if store.exists(PATH + STORE) and all(processed):
+        # memory-map data
+        data = store.load(PATH + STORE)
+        lookup, metadata = [read_pickle(PATH + pfile) 
+                for pfile in PICKLES[1:]]
+
+    elif os.path.isfile(PATH + PICKLES[0]) and all(processed):
         data, lookup, metadata = [read_pickle(PATH + pfile) 
                 for pfile in PICKLES]
 
-    return pad_data(data, metadata), lookup, metadata
+    else:
+        data, lookup, metadata = process()
+
+    # leave padding to feed
+    if not pad:
+        return ragged_data(data), lookup, metadata
+
+    return pad_data(data, metadata, cmask=cmask), lookup, metadata
 
 
 
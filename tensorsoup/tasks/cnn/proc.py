@@ -16,7 +16,10 @@ from pprint import pprint, pformat
 import os
 from pprint import pprint
 from tqdm import tqdm
+from collections import Counter
+from multiprocessing import Pool
 from tproc.utils import preprocess_text, serialize, vectorize_tree, pad_seq
+from tproc import store
 from tproc.dictionary import Dictionary, buildDictionary
 
 
@@ -73,7 +76,12 @@ def process_sample(filename, data, vocab):
         
     return data, vocab
     
-def process_set(dirname, vocab):
+def process_set(dirname, vocab, workers=1):
+
+    # fan out to a process pool
+    #  (None -> one worker per cpu, <= 1 -> sequential)
+    if workers is None or workers > 1:
+        return process_set_parallel(dirname, vocab, workers)
 
     data = {'context': [], 'question' : [], 'answer':[], 'candidates':[]}
     for filename in tqdm(os.listdir(dirname)):
@@ -81,23 +89,104 @@ def process_set(dirname, vocab):
 
     return data, vocab
 
-def process():
+
+FIELDS = [ 'context', 'question', 'answer', 'candidates' ]
+
+def read_sample(filename):
+    with open(filename, 'r') as sample:
+        return string_to_sample(sample.read())
+
+def scan_shard(filenames):
+    '''
+        tokenize files in shard
+         returns words in order of first occurrence,
+          word counts and max context/question lengths
+    '''
+    seen, counts, clen, qlen = {}, Counter(), 0, 0
+    for filename in filenames:
+        context, question, answer, candidates = read_sample(filename)
+        clen, qlen = max(clen, len(context)), max(qlen, len(question))
+        # same order as process_sample
+        for words in [context, question, answer, candidates]:
+            counts.update(words)
+            for w in words:
+                seen.setdefault(w, None)
+
+    return list(seen), counts, clen, qlen
+
+# word to index, per worker
+_w2i, _unk = {}, 0
+
+def init_vectorizer(w2i, unk):
+    global _w2i, _unk
+    _w2i, _unk = w2i, unk
+
+def vectorize_shard(filenames):
+    data = { k:[] for k in FIELDS }
+    for filename in filenames:
+        for k, words in zip(FIELDS, read_sample(filename)):
+            # words missing from vocab are not worthy -> UNK
+            data[k].append([ _w2i.get(w, _unk) for w in words ])
+
+    return data
+
+def process_set_parallel(dirname, vocab, workers=None, shard_size=1000):
+    '''
+        [1/2] tokenize and count words in shards
+        [2/2] vectorize shards with merged vocabulary
+
+        shards are merged in order, so vocabulary and data
+         match process_set(workers=1)
+    '''
+    if workers is not None and workers < 1:
+        raise ValueError('workers must be >= 1, got {}'.format(workers))
+
+    filenames = [ dirname+'/'+filename for filename in os.listdir(dirname) ]
+    shards = [ filenames[i:i+shard_size] 
+            for i in range(0, len(filenames), shard_size) ]
+
+    with Pool(workers) as pool:
+        for seen, counts, clen, qlen in tqdm(pool.imap(scan_shard, shards),
+                total=len(shards)):
+            vocab.metadata['clen'] = max(vocab.metadata['clen'], clen)
+            vocab.metadata['qlen'] = max(vocab.metadata['qlen'], qlen)
+            # add new words in order of first occurrence
+            for w in seen:
+                if vocab.is_worthy(w) and w not in vocab.word2idx:
+                    vocab.idx2word.append(w)
+                    vocab.word2idx[w] = vocab.size
+                    vocab.size += 1
+            # merge counts
+            for w, c in counts.items():
+                vocab.word_counter[w] = vocab.word_counter.get(w, 0) + c
+
+    data = { k:[] for k in FIELDS }
+    with Pool(workers, initializer=init_vectorizer,
+            initargs=(vocab.word2idx, vocab.word2idx['UNK'])) as pool:
+        for shard in tqdm(pool.imap(vectorize_shard, shards), total=len(shards)):
+            for k in FIELDS:
+                data[k].extend(shard[k])
+
+    return data, vocab
+
+def process(dsets=None, workers=1):
+    dsets = dsets if dsets else [TEST]
 
     vocab = CNNDict(['PAD', 'UNK'])
     vocab.metadata = {'clen' : 0, 'qlen':0}
     
     basedirs = {
-        #'train' :  '../../../datasets/cnn/questions/training',
+        'train' :  '../../../datasets/cnn/questions/training',
         'test' :  '../../../datasets/cnn/questions/test',
-        #'valid' :  '../../../datasets/cnn/questions/validation',
+        'valid' :  '../../../datasets/cnn/questions/validation',
         }
 
     data = {}
-    for set in basedirs.keys():
-        d, v = process_set(basedirs[set], vocab)
+    for set in dsets:
+        d, v = process_set(basedirs[set], vocab, workers)
         data[set] = d
 
-    serialize(data, ROOT + 'data.pkl')
+    store.save(ROOT + 'store', data)
     serialize(vocab.__dict__, ROOT + 'vocab.pkl')
     
     return data, vocab
@@ -128,12 +217,13 @@ def pad_data(data, vocab, truncate=False):
 
 
 import pickle
-def gather(fresh=False):
+def gather(fresh=False, workers=1):
     vocab  = CNNDict([])
-    if fresh or  not os.path.exists(ROOT+'/data.pkl'):
-        process()
+    if fresh or  not store.exists(ROOT+'/store'):
+        process(workers=workers)
 
-    data = pickle.load(open(ROOT+'/data.pkl', 'rb'))
+    # memory-map data
+    data = store.load(ROOT+'/store')
     vocab.__dict__ = pickle.load(open(ROOT+'/vocab.pkl', 'rb'))
 
     print(vocab.size)
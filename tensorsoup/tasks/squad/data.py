@@ -1,18 +1,32 @@
 import json
 import pickle
 import os
+import sys
 
 import numpy as np
 import random
 
-from nltk import word_tokenize
+sys.path.append('../../')
+
+import tasks.squad.proc as proc
+
+from cache import BatchCache
+from datafeed import Prefetcher, take
+from tproc import store
+from tproc.glove import Glove
+from tproc.ragged import Ragged
 
 
 class DataSource(object):
 
+    # reserved token ids (as_indices)
+    PAD, UNK = 0, 1
+
     def __init__(self, batch_size, datadir='../../../datasets/SQuAD/',
             glove_file='../../../datasets/glove/glove.6B.100d.txt', 
-            random_x=None):
+            random_x=None, glove_dtype=np.float32, glove_vocab_only=False,
+            as_indices=False, cache_bytes=2**30, spill_dir=None, 
+            share_passages=False):
 
         # 100d -> glove_file='datasets/glove/glove.6B.100d.txt'):
         # 200d -> glove_file='datasets/glove/glove.6B.200d.txt'):
@@ -21,7 +35,8 @@ class DataSource(object):
         self.batch_size = batch_size
 
         # check if processed data exists
-        if os.path.isfile(datadir + '/data.train'):
+        if (store.exists(datadir + '/store.train') or 
+                os.path.isfile(datadir + '/data.train')):
             # load data
             self.train = self.load(datadir, tag='train')
             self.test   = self.load(datadir, tag='test')
@@ -32,19 +47,44 @@ class DataSource(object):
         # convenience dict
         self.data = { 'train' : self.train, 'test' : self.test }
 
-        # data cache
-        self.cache = { 'train' : {}, 'test' : {} }
+        # batches carry unique passages plus an index
+        #  from questions to passages (MatchLSTM share_passages)
+        self.share_passages = share_passages
+        # order of examples (share_passages), epoch of each set
+        self.groups, self.order = {}, {}
+        self.epoch = { 'train' : 0, 'test' : 0 }
+        if share_passages:
+            # questions of a paragraph end up in the same batch
+            #  rows are gathered through an index, data stays mapped
+            for dtype, data in self.data.items():
+                self.groups[dtype] = self.group_by_paragraph(data)
+                self.new_epoch(dtype)
+
+        # data cache (LRU, bounded by cache_bytes)
+        #  evicted batches spill to spill_dir if given
+        self.cache = BatchCache(max_bytes=cache_bytes, spill_dir=spill_dir)
 
         # num of examples
         self.n = {}
-        self.n['train'] = len(self.data['train']['passages'])
-        self.n['test']   = len(self.data['test']['passages'])
+        self.n['train'] = len(self.data['train']['queries'])
+        self.n['test']   = len(self.data['test']['queries'])
 
         print('Initializing Glove Model ...')
-        self.glove = self.loadGloveModel(glove_file)
+        self.glove = self.loadGloveModel(glove_file, glove_dtype)
+
+        # keep only rows of words in SQuAD
+        if glove_vocab_only:
+            self.glove = self.glove.subset(self.vocabulary())
+            print('Kept {} glove vectors'.format(len(self.glove)))
 
         # infer glove dimensions
-        self.glove_dim = len(self.glove['ocelot'])
+        self.glove_dim = self.glove.dim
+
+        # batches of token ids instead of embeddings
+        #  ids index rows of embedding_matrix()
+        self.as_indices = as_indices
+        self.vocab_size = len(self.glove) + 2
+        self.vocab_ids = {}
 
         # current iteration
         self.i = 0
@@ -71,31 +111,33 @@ class DataSource(object):
         # prepare train set
         print('Preparing Training Set ...')
 
-        def shuffle(a,b,c,d):
-            idx = list(range(len(a)))
+        def shuffle(*fields):
+            idx = list(range(len(fields[0])))
             random.shuffle(idx)
-            sa, sb, sc, sd = [], [], [], []
-            for i in idx:
-                sa.append(a[i])
-                sb.append(b[i])
-                sc.append(c[i])
-                sd.append(d[i])
-            return sa, sb, sc, sd
-
-        cons,qs,sps,eps = self.get_dataset(datadir + 'train-v1.1.json')
-        cons,qs,sps, eps = shuffle(cons,qs,sps, eps) 
+            return [ [ field[i] for i in idx ] for field in fields ]
+
+        # tokens of paragraphs/questions, cached across runs
+        self.tokenizer = proc.TokenCache(datadir + '/tokens.cache')
+
+        # paragraphs are stored once (not shuffled),
+        #  questions refer to them by id
+        paras,pids,qs,sps,eps = self.get_dataset(datadir + 'train-v1.1.json')
+        pids,qs,sps,eps = shuffle(pids,qs,sps,eps) 
         self.train = {}
-        self.train['passages'] = cons
+        self.train['paragraphs'] = paras
+        self.train['pids'] = pids
         self.train['queries'] = qs
         self.train['sps'] = sps
         self.train['eps'] = eps
 
         # prepare test set
         print('Preparing test Set ...')
-        cons,qs,sps,eps = self.get_dataset(datadir + 'dev-v1.1.json')
-        cons,qs,sps, eps = shuffle(cons,qs,sps, eps) 
+        paras,pids,qs,sps,eps = self.get_dataset(datadir + 'dev-v1.1.json')
+        self.tokenizer.save()
+        pids,qs,sps,eps = shuffle(pids,qs,sps,eps) 
         self.test = {}
-        self.test['passages'] = cons
+        self.test['paragraphs'] = paras
+        self.test['pids'] = pids
         self.test['queries'] = qs
         self.test['sps'] = sps
         self.test['eps'] = eps
@@ -106,14 +148,19 @@ class DataSource(object):
 
 
     def save(self, data_dict, datadir='.', tag='train'):
-        filename = datadir + '/data.' + tag
-        print('Writing processed data to ' + filename)
-        # write to disk
-        with open(filename, 'wb') as f:
-            pickle.dump(data_dict, f)
+        path = datadir + '/store.' + tag
+        print('Writing processed data to ' + path)
+        # write to disk (columnar)
+        store.save(path, { tag : data_dict })
 
 
     def load(self, datadir='.', tag='train'):
+        path = datadir + '/store.' + tag
+        # memory-map columnar store
+        if store.exists(path):
+            print('Mapping processed data from ' + path)
+            return store.load(path)[tag]
+
         filename = datadir + '/data.' + tag
         print('Reading processed data from ' + filename)
         # read from disk
@@ -126,37 +173,112 @@ class DataSource(object):
     def batch(self, dtype, i, batch_size):
 
         # check in cache
-        if i in self.cache[dtype]:
-            return self.cache[dtype][i]
+        #  (batches change with order of each epoch)
+        key = (dtype, self.epoch[dtype], i)
+        batch_i = self.cache.get(key)
+        if batch_i is not None:
+            return batch_i
 
         # fetch 'i'th batch
         s, e = i*batch_size, (i+1)*batch_size
-        p, q = self.data[dtype]['passages'][s:e], self.data[dtype]['queries'][s:e]
+        data = self.data[dtype]
+
+        if self.share_passages:
+            # rows of current (paragraph grouped) order
+            idx = self.order[dtype][s:e]
+            q = take(data['queries'], idx)
+            sps, eps = take(data['sps'], idx), take(data['eps'], idx)
+            # unique passages, question -> passage index
+            pids = np.asarray(take(data['pids'], idx))
+            upids, pidx = np.unique(pids, return_inverse=True)
+            p = take(data['paragraphs'], upids)
+        else:
+            q = data['queries'][s:e]
+            sps, eps = data['sps'][s:e], data['eps'][s:e]
+            p = self.passages(dtype, s, e)
 
         # prepare padding mask
-        lens = [len(item) for item in p]
+        lens = p.lengths() if isinstance(p, Ragged) else [len(item) for item in p]
+        if self.share_passages:
+            # mask per question
+            lens = np.asarray(lens)[pidx]
 
         mask = np.ones([batch_size, max(lens)])
 
-        for i,l in enumerate(lens):
-            mask[i][l:] = 0.
+        for j,l in enumerate(lens):
+            mask[j][l:] = 0.
         # tile mask to get shape 2xBxLp
         mask = np.array([mask, mask], dtype=np.float32)
 
-        # embed passages and queries
-        batch_p = self.embed_sequences(p, as_array=True)
-        batch_q = self.embed_sequences(q, as_array=True)
+        if self.as_indices:
+            # token ids -> embedded in graph
+            batch_p = self.index_sequences(p)
+            batch_q = self.index_sequences(q)
+        else:
+            # embed passages and queries
+            batch_p = self.embed_sequences(p, as_array=True)
+            batch_q = self.embed_sequences(q, as_array=True)
 
-        batch_targets = np.array([self.data[dtype]['sps'][s:e], self.data[dtype]['eps'][s:e]])
+        batch_targets = np.array([sps, eps])
 
         batch_i = (batch_p, batch_q, batch_targets, mask)
+        if self.share_passages:
+            batch_i = batch_i + (pidx.astype(np.int32),)
 
         # save to cache
-        self.cache[dtype][i] = batch_i
+        self.cache.put(key, batch_i)
 
         return batch_i
 
 
+    '''
+        passages of examples [s, e)
+         gathered from paragraph table by id
+
+    '''
+    def passages(self, dtype, s, e):
+        data = self.data[dtype]
+        # processed before paragraph table
+        if 'paragraphs' not in data:
+            return data['passages'][s:e]
+        return take(data['paragraphs'], np.asarray(data['pids'][s:e]))
+
+
+    '''
+        rows (questions) of each paragraph
+
+    '''
+    def group_by_paragraph(self, data):
+        if 'paragraphs' not in data:
+            raise ValueError('share_passages needs a paragraph table; ' + 
+                    'remove processed data in {} to rebuild it'.format(self.datadir))
+
+        pids = np.asarray(data['pids'])
+        order = np.argsort(pids, kind='mergesort')
+        # split at paragraph boundaries
+        return np.split(order, np.flatnonzero(np.diff(pids[order])) + 1)
+
+
+    '''
+        next epoch of dtype
+
+         share_passages -> paragraphs (with their questions)
+          are visited in a new order (train)
+
+    '''
+    def new_epoch(self, dtype):
+        if not self.share_passages:
+            return
+        groups = self.groups[dtype]
+        if dtype == 'train' or dtype not in self.order:
+            perm = range(len(groups))
+            if dtype == 'train':
+                perm = np.random.permutation(len(groups))
+                # cached batches of old order are stale
+                self.epoch[dtype] += 1
+            self.order[dtype] = np.concatenate([ groups[k] for k in perm ])
+
+
     def rand_next_batch(self, dtype='train'):
         # select train/test
         i = np.random.randint(0, self.n[dtype]//self.batch_size -1)
@@ -167,23 +289,37 @@ class DataSource(object):
 
         if n==1:
             bi = self.batch(dtype, self.i, batch_size=self.batch_size)
-            if self.i < self.n[dtype]//self.batch_size:
+            # last full batch -> wrap
+            if self.i + 1 < self.n[dtype]//self.batch_size:
                 self.i = self.i + 1
             else:
                 self.i = 0
+                self.new_epoch(dtype)
             return bi
         
         return self.next_n_batches(n, dtype=dtype)
 
 
+    def getN(self, dtype='train'):
+        return self.n[dtype]
+
+
+    def prefetch(self, size=4, dtype='train'):
+        # embed next batches in background
+        return Prefetcher(lambda : self.next_batch(1, dtype=dtype),
+                n=self.n[dtype], size=size, batch_size=self.batch_size)
+
+
     def next_n_batches(self, n, dtype='train'):
         bi_n = []
         for _ in range(n):
             bi_n.append(self.batch(dtype, self.i, batch_size=self.batch_size))
-            if self.i < self.n[dtype]//self.batch_size:
+            # last full batch -> wrap
+            if self.i + 1 < self.n[dtype]//self.batch_size:
                 self.i = self.i + 1
             else:
                 self.i = 0
+                self.new_epoch(dtype)
         return bi_n
 
 
@@ -206,52 +342,77 @@ class DataSource(object):
 
 
     def get_dataset(self, path):
-        contexts = []
-        questions = []
-        start_char_positions = []
-        end_char_positions = []
-        start_word_positions = []
-        end_word_positons = []
-        with open(path) as f:
-            x = json.load(f)
-        for data in x['data']:
-            for para in data['paragraphs']:
-                for qa in para['qas']:
-                    temp_ans = [] # To avoid duplicate questions with same answers
-                    for answer in qa['answers']:
-                        if answer['text'] not in temp_ans:
-                            # fetch row
-                            context = para['context']
-                            question = qa['question']
-                            sch_pos = answer['answer_start']
-                            ech_pos = answer['answer_start'] + len((answer['text']))
-                            
-                            # infer answer word-level positions
-                            sw_pos = len(word_tokenize(context[:sch_pos]))
-                            ew_pos = len(word_tokenize(context[:ech_pos])) -1
-
-                            contexts.append(word_tokenize(context))
-                            questions.append(word_tokenize(question))
-                            start_word_positions.append(sw_pos)
-                            end_word_positons.append(ew_pos)
-
-        return contexts, questions, start_word_positions, end_word_positons
-
-
-    def loadGloveModel(self, gloveFile):
-        f = open(gloveFile,'r')
-        model = {}
-        for line in f:
-            splitLine = line.split(' ')
-            word = splitLine[0]
-            embedding = [float(val) for val in splitLine[1:]]
-            model[word] = embedding
+        # tokenize each paragraph once
+        #  answers are aligned by char offsets
+        return proc.read_squad(path, self.tokenizer)
+
+
+    def loadGloveModel(self, gloveFile, dtype=np.float32):
+        # binary cache is built on first load
+        #  and memory-mapped afterwards
+        model = Glove.load(gloveFile, dtype=dtype)
         print("Done.",len(model)," words loaded!")
         return model
 
 
+    '''
+        words in passages and queries
+         of train and test sets
+
+    '''
+    def vocabulary(self):
+        words = set()
+        for dtype in ['train', 'test']:
+            for k in ['paragraphs', 'passages', 'queries']:
+                if k not in self.data[dtype]:
+                    continue
+                seqs = self.data[dtype][k]
+                if isinstance(seqs, Ragged):
+                    words.update(seqs.vocab.tolist())
+                else:
+                    words.update(w for seq in seqs for w in seq)
+        return words
+
+
+    '''
+        glove vectors with rows for PAD and UNK (zeros)
+         feed to model.emb_init when initializing variables
+
+    '''
+    def embedding_matrix(self):
+        matrix = np.zeros([self.vocab_size, self.glove_dim], dtype=np.float32)
+        matrix[2:] = self.glove.vectors
+        return matrix
+
+
+    def word_ids(self, words):
+        # missing words -> -1 + 2 = UNK
+        w2i = self.glove.w2i
+        return [ w2i.get(w, -1) + 2 for w in words ]
+
+
+    '''
+        pad token ids of sequences
+
+         ragged (store) fields hold ids into their own vocab,
+          which is mapped to glove ids once
+
+    '''
+    def index_sequences(self, seqs):
+        if isinstance(seqs, Ragged) and seqs.vocab is not None:
+            key = id(seqs.vocab)
+            if key not in self.vocab_ids:
+                self.vocab_ids[key] = np.array(self.word_ids(seqs.vocab.tolist()),
+                        dtype=np.int32)
+            seqs = Ragged(self.vocab_ids[key][seqs.values], seqs.offsets)
+        else:
+            seqs = Ragged.from_list([ self.word_ids(seq) for seq in seqs ])
+
+        return seqs.pad(PAD=self.PAD, dtype=np.int32)
+
+
     def embed_word(self, word):
-        return np.array(self.glove[word]) if word in self.glove else np.zeros(self.glove_dim)
+        return np.array(self.glove[word], dtype=np.float32) if word in self.glove else np.zeros(self.glove_dim)
 
 
     def embed_sequences(self, seqs, as_array=False):
@@ -0,0 +1,146 @@
+'''
+    SQuAD preprocessing
+
+    each paragraph (and question) is tokenized once;
+     the char offset of every token is recorded, and answer
+      spans are mapped to token positions by binary search
+
+    tokenized texts are cached on disk, keyed by sha1 of
+     the text, so re-processing skips the tokenizer
+
+'''
+import hashlib
+import json
+import os
+import pickle
+
+from bisect import bisect_left, bisect_right
+
+from nltk import word_tokenize
+
+
+# nltk rewrites double quotes
+#  (", `` or '' in text -> `` or '')
+QUOTES = [ '``', "''" ]
+
+
+def align(text, tokens):
+    '''
+        align(str : text, list : tokens) -> (list : starts, list : ends)
+            char span of each token in text
+    '''
+    starts, ends, cursor = [], [], 0
+    for token in tokens:
+        # tokens are contiguous -> next token starts
+        #  at the first non-space char after cursor
+        pos = cursor
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        # quotes -> original quote chars
+        quote = [ q for q in QUOTES + ['"'] 
+                if token in QUOTES and text.startswith(q, pos) ]
+        if text.startswith(token, pos):
+            end = pos + len(token)
+        elif quote:
+            end = pos + len(quote[0])
+        else:
+            # token rewritten by tokenizer -> search ahead,
+            #  or assume it starts at cursor
+            found = text.find(token, cursor)
+            pos = found if found >= 0 else pos
+            end = pos + len(token)
+        cursor = end
+        starts.append(pos)
+        ends.append(end)
+    return starts, ends
+
+
+def answer_span(starts, ends, sch_pos, ech_pos):
+    '''
+        answer_span(list : starts, list : ends, int : sch_pos, int : ech_pos) 
+            -> (int, int)
+            (char span) -> (word span)
+             first token ending after sch_pos,
+             last token starting before ech_pos
+    '''
+    sw_pos = bisect_right(ends, sch_pos)
+    ew_pos = bisect_left(starts, ech_pos) - 1
+    return sw_pos, ew_pos
+
+
+class TokenCache(object):
+    '''
+        text -> (tokens, starts, ends)
+
+        [usage]
+        tokenizer = TokenCache('tokens.cache')
+        tokens, starts, ends = tokenizer(context)
+        tokenizer.save()
+    '''
+    def __init__(self, path=None, tokenize=word_tokenize):
+        self.path = path
+        self.tokenize = tokenize
+        self.dirty = False
+
+        self.cache = {}
+        if path and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                self.cache = pickle.load(f)
+
+    def __call__(self, text):
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        if key not in self.cache:
+            tokens = self.tokenize(text)
+            self.cache[key] = (tokens,) + align(text, tokens)
+            self.dirty = True
+        return self.cache[key]
+
+    def save(self):
+        if self.path and self.dirty:
+            with open(self.path, 'wb') as f:
+                pickle.dump(self.cache, f, pickle.HIGHEST_PROTOCOL)
+            self.dirty = False
+
+
+def read_squad(path, tokenizer):
+    '''
+        read_squad(str : path, TokenCache : tokenizer) ->
+            paragraphs, paragraph ids, questions, 
+             start word positions, end word positions
+
+        paragraphs are stored once;
+         each question refers to its paragraph by id
+
+    '''
+    paragraphs = []
+    paragraph_ids = []
+    questions = []
+    start_word_positions = []
+    end_word_positons = []
+    with open(path) as f:
+        x = json.load(f)
+    for data in x['data']:
+        for para in data['paragraphs']:
+            # tokenize paragraph once
+            context, starts, ends = tokenizer(para['context'])
+            pid = len(paragraphs)
+            paragraphs.append(context)
+            for qa in para['qas']:
+                question = tokenizer(qa['question'])[0]
+                temp_ans = [] # To avoid duplicate questions with same answers
+                for answer in qa['answers']:
+                    if answer['text'] not in temp_ans:
+                        sch_pos = answer['answer_start']
+                        ech_pos = answer['answer_start'] + len((answer['text']))
+
+                        # infer answer word-level positions
+                        sw_pos, ew_pos = answer_span(starts, ends, 
+                                sch_pos, ech_pos)
+
+                        paragraph_ids.append(pid)
+                        questions.append(question)
+                        start_word_positions.append(sw_pos)
+                        end_word_positons.append(ew_pos)
+
+    return (paragraphs, paragraph_ids, questions, 
+            start_word_positions, end_word_positons)
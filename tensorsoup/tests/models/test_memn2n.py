@@ -0,0 +1,49 @@
+import tensorflow as tf
+import numpy as np
+
+import sys
+sys.path.append('../../')
+
+from models.memorynet.memn2n import MemoryNet
+from train.trainer import stack_batches
+
+
+class MultistepTest(tf.test.TestCase):
+
+    def test_multistep(self):
+        rng = np.random.RandomState(0)
+        memsize, slen, qlen, vocab_size, candidates = 10, 5, 4, 30, 8
+
+        model = MemoryNet(hdim=20, num_hops=3, memsize=memsize,
+                sentence_size=slen, qlen=qlen, vocab_size=vocab_size,
+                num_candidates=candidates, multistep=True)
+
+        batches = [ [ rng.randint(1, vocab_size, [16, memsize, slen]),
+                      rng.randint(1, vocab_size, [16, qlen]),
+                      rng.randint(0, candidates, [16]) ] for _ in range(3) ]
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            init = sess.run(tf.global_variables())
+
+            # one step per run (mode 2 -> no memory noise)
+            losses = []
+            for batch in batches:
+                feed_dict = dict(zip(model.placeholders, batch))
+                feed_dict.update({ model.mode : 2, model.lr : 0.01 })
+                losses.append(sess.run([model.loss, model.train_op], feed_dict)[0])
+            params = sess.run(tf.trainable_variables())
+
+            # all steps in one run, from same init
+            for var, value in zip(tf.global_variables(), init):
+                var.load(value, sess)
+            feed_dict = dict(zip(model.multistep_placeholders, stack_batches(batches)))
+            feed_dict.update({ model.mode : 2, model.lr : 0.01 })
+
+            self.assertAllClose(sess.run(model.multistep_losses, feed_dict), losses)
+            for p1, p2 in zip(sess.run(tf.trainable_variables()), params):
+                self.assertAllClose(p1, p2)
+
+
+if __name__ == '__main__':
+    tf.test.main()
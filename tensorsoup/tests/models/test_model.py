@@ -0,0 +1,108 @@
+import tensorflow as tf
+import numpy as np
+
+import sys
+sys.path.append('../../')
+
+from models.model import Model
+from models.graph import Graph
+from train.trainer import Trainer, tower_throughput
+from multigpu import cpu_config
+
+
+class BagOfWords(Graph):
+
+    def __init__(self, vocab_size=20, dim=8, num_classes=4):
+        x = tf.placeholder(tf.int32, [None, 5], name='x')
+        y = tf.placeholder(tf.int32, [None, ], name='y')
+        self.mode = tf.placeholder(tf.int32, shape=[], name='mode')
+        self.lr = tf.placeholder(tf.float32, shape=[], name='lr')
+
+        emb = tf.get_variable('emb', [vocab_size, dim])
+        W = tf.get_variable('W', [dim, num_classes])
+        logits = tf.matmul(tf.reduce_sum(tf.nn.embedding_lookup(emb, x), axis=1), W)
+
+        self.loss = tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(
+            logits=logits, labels=y))
+        self.prob = tf.nn.softmax(logits)
+        self.accuracy = tf.reduce_mean(tf.cast(tf.equal(
+            tf.cast(y, tf.int64), tf.argmax(logits, axis=-1)), tf.float32))
+        self.placeholders = { 'x' : x, 'y' : y }
+
+
+class ModelTest(tf.test.TestCase):
+
+    def test_accumulate(self):
+        model = Model(BagOfWords, dformat=['x', 'y'],
+                optimizer=tf.train.GradientDescentOptimizer, lr=0.5,
+                accumulate=True)
+
+        rng = np.random.RandomState(0)
+        x, y = rng.randint(0, 20, [32, 5]), rng.randint(0, 4, [32])
+
+        with self.test_session() as sess:
+            sess.run(tf.global_variables_initializer())
+            init = sess.run(tf.trainable_variables())
+
+            # one update on full batch
+            sess.run(model.train_op, dict(zip(model.placeholders, [x, y])))
+            params = sess.run(tf.trainable_variables())
+
+            # same update from 2 micro-batches
+            for var, value in zip(tf.trainable_variables(), init):
+                var.load(value, sess)
+            for k in range(2):
+                sess.run(model.accumulate_op, dict(zip(model.placeholders,
+                    [x[k*16:(k+1)*16], y[k*16:(k+1)*16]])))
+            sess.run(model.apply_op)
+
+            for p1, p2 in zip(sess.run(tf.trainable_variables()), params):
+                self.assertAllClose(p1, p2)
+            # accumulators reset
+            self.assertEqual(sess.run(model.accumulated), 0.)
+            for acc in sess.run(model.accumulators):
+                self.assertFalse(acc.any())
+
+    def test_towers(self):
+        model = Model(BagOfWords, dformat=['x', 'y'], n=2,
+                GPUs=[0, 1], device='cpu')
+
+        rng = np.random.RandomState(0)
+        x, y = rng.randint(0, 20, [32, 5]), rng.randint(0, 4, [32])
+
+        with tf.Session(config=cpu_config(2)) as sess:
+            sess.run(tf.global_variables_initializer())
+            trainer = Trainer(sess, model, batch_size=32)
+
+            # one shard of global batch per tower
+            feed_dict = trainer.extra_params(
+                    trainer.build_feed(model.placeholders, [x, y]), 
+                    Trainer.TRAIN, 0.01)
+            for k, (xk, yk) in enumerate(model.placeholders):
+                self.assertEqual(feed_dict[xk].tolist(), x[k*16:(k+1)*16].tolist())
+                self.assertEqual(feed_dict[yk].tolist(), y[k*16:(k+1)*16].tolist())
+                self.assertEqual(xk.device, '/device:CPU:{}'.format(k))
+
+            run_metadata = tf.RunMetadata()
+            loss, _ = sess.run([model.loss, model.train_op], feed_dict,
+                    options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
+                    run_metadata=run_metadata)
+            self.assertTrue(np.isfinite(loss))
+
+            # throughput measured on each tower device
+            rates = tower_throughput(run_metadata, trainer.tower_devices(), 16)
+            self.assertEqual([ device for device, _ in rates ], 
+                    [ 'device:CPU:0', 'device:CPU:1' ])
+            self.assertTrue(all( rate > 0 for _, rate in rates ))
+
+            # shards must be equal
+            self.assertRaises(ValueError, trainer.evaluate, 
+                    feed=None, batch_size=31)
+            # shared passages cannot be sharded
+            model.share_passages = True
+            self.assertRaises(ValueError, trainer.check_towers,
+                    model.placeholders, 32)
+
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -0,0 +1,71 @@
+import unittest
+import tempfile
+import glob
+import os
+
+import sys
+sys.path.append('../')
+
+import tasks.babi.proc as proc
+
+
+STORY = '''1 Mary moved to the bathroom.
+2 John went to the hallway.
+3 Where is Mary? \tbathroom\t1
+4 Daniel went back to the {}.
+5 Where is Daniel? \t{}\t4
+'''
+
+
+class BabiCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for i in range(1, 21):
+            for tag in [ 'train', 'test' ]:
+                self.write(i, tag, 'garden')
+
+        # count tasks actually processed
+        self.processed = []
+        self.process_task = proc.process_task
+        def process_task(tid, *args):
+            self.processed.append(tid)
+            return self.process_task(tid, *args)
+        proc.process_task = process_task
+
+    def tearDown(self):
+        proc.process_task = self.process_task
+
+    def write(self, tid, tag, place):
+        filename = '{}/qa{}_task_{}.txt'.format(self.path, tid, tag)
+        with open(filename, 'w') as f:
+            # last story of a file is not read
+            f.write(STORY.format(place, place)*2)
+
+    def cache_files(self, tid):
+        return glob.glob('{}/cache.1k/task{}.*'.format(self.path, tid))
+
+    def test_cache(self):
+        data, _ = proc.process(self.path, '1k', serialize=False, workers=1)
+        self.assertEqual(sorted(self.processed), list(range(1, 21)))
+
+        # cache hits
+        self.processed = []
+        cached, _ = proc.process(self.path, '1k', serialize=False, workers=1)
+        self.assertEqual(self.processed, [])
+        self.assertEqual(list(cached[3]['train']['answers']),
+                list(data[3]['train']['answers']))
+
+        # changed file -> only that task
+        self.write(3, 'train', 'kitchen')
+        changed, _ = proc.process(self.path, '1k', serialize=False, workers=1)
+        self.assertEqual(self.processed, [3])
+        self.assertTrue('kitchen' in changed[3]['metadata']['w2i'])
+
+        # stale entry removed
+        self.assertEqual(len(self.cache_files(3)), 1)
+        self.assertEqual(len(self.cache_files(4)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+
+import sys
+sys.path.append('../')
+
+from cache import BatchCache
+
+
+class BatchCacheTest(unittest.TestCase):
+
+    def test_lru(self):
+        # room for 2 batches of 800 bytes
+        cache = BatchCache(max_bytes=1600)
+        batch = lambda i : (np.full(100, i, dtype=np.float32), np.arange(100, dtype=np.float32))
+
+        self.assertEqual(cache.get(0), None)
+        cache.put(0, batch(0))
+        cache.put(1, batch(1))
+        # touch 0 -> 1 is least recently used
+        self.assertEqual(cache.get(0)[0][0], 0)
+        cache.put(2, batch(2))
+
+        self.assertTrue(0 in cache and 2 in cache)
+        self.assertFalse(1 in cache)
+        self.assertTrue(cache.nbytes <= 1600)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 1, 1))
+
+    def test_spill(self):
+        cache = BatchCache(max_bytes=1000, spill_dir=tempfile.mkdtemp())
+        cache.put(('train', 0), (np.ones([10, 10]),))
+        cache.put(('train', 1), (np.zeros([10, 10]),))
+
+        # evicted batch is mapped back from disk
+        spilled = cache.get(('train', 0))
+        self.assertTrue(isinstance(spilled[0], np.memmap))
+        self.assertEqual(spilled[0].sum(), 100)
+        self.assertEqual((cache.evictions, cache.spill_hits), (1, 1))
+
+    def test_spill_bound(self):
+        spill_dir = tempfile.mkdtemp()
+        # room for 1 batch in memory, 2 on disk
+        cache = BatchCache(max_bytes=800, spill_dir=spill_dir, max_spill_bytes=1600)
+        for i in range(5):
+            cache.put(i, (np.full([10, 10], i, dtype=np.float64),))
+
+        # 4 evicted, oldest 2 deleted from disk
+        self.assertEqual(list(cache.spilled), [2, 3])
+        self.assertTrue(cache.spill_bytes <= 1600)
+        self.assertEqual(cache.get(3)[0][0, 0], 3)
+        self.assertEqual(cache.get(0), None)
+
+        # scratch dir removed
+        scratch = cache.spill_dir
+        cache.close()
+        self.assertFalse(os.path.isdir(scratch))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import tempfile
+import numpy as np
+import tensorflow as tf
+
+import sys
+sys.path.append('../')
+
+from train.checkpoint import Checkpointer
+from train.trainer import Trainer
+from datafeed import DataFeed
+
+
+class Regression(object):
+
+    def __init__(self):
+        tf.reset_default_graph()
+        x = tf.placeholder(tf.float32, [None, 4], name='x')
+        y = tf.placeholder(tf.float32, [None, ], name='y')
+        self.mode = tf.placeholder(tf.int32, shape=[], name='mode')
+        self.lr = tf.placeholder(tf.float32, shape=[], name='lr')
+
+        w = tf.get_variable('w', [4, 1])
+        pred = tf.squeeze(tf.matmul(x, w), axis=1)
+        self.loss = tf.reduce_mean((pred - y)**2)
+        self.accuracy = -self.loss
+        self.train_op = tf.train.AdamOptimizer(self.lr).minimize(self.loss)
+        self.placeholders = [x, y]
+
+
+class CheckpointTest(tf.test.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.x = rng.randn(40, 4).astype(np.float32)
+        self.data = { 'x' : self.x, 'y' : self.x.sum(axis=1) }
+
+    def test_save_restore(self):
+        Regression()
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            ckpt = Checkpointer(tempfile.mkdtemp())
+            values = sess.run(tf.global_variables())
+
+            ckpt.save(sess, 1, { 'step' : 1 })
+            ckpt.wait()
+
+            # variables change after save
+            sess.run(tf.global_variables_initializer())
+            self.assertEqual(ckpt.restore(sess), { 'step' : 1 })
+            for value, restored in zip(values, sess.run(tf.global_variables())):
+                self.assertAllEqual(value, restored)
+
+    def test_resume(self):
+        path = tempfile.mkdtemp()
+
+        def train(resume):
+            model = Regression()
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                feed = DataFeed(['x', 'y'], data=self.data, shuffle=True)
+                trainer = Trainer(sess, model, feed, batch_size=8, lr=0.01,
+                        checkpoint_dir=path, checkpoint_steps=3)
+                trainer.fit(2, verbose=False, resume=resume)
+                return (sess.run(tf.global_variables()), feed.state(), 
+                        trainer.step)
+
+        # 5 steps per epoch, checkpoints at steps 3, 6, 9
+        params, state, step = train(resume=False)
+        # from step 9 (epoch 1, iteration 4) -> runs step 10 only
+        resumed_params, resumed_state, resumed_step = train(resume=True)
+
+        self.assertEqual(resumed_step, step)
+        # params and optimizer slots
+        for p1, p2 in zip(resumed_params, params):
+            self.assertAllClose(p1, p2)
+        # feed position and order
+        self.assertEqual(resumed_state['offset'], state['offset'])
+        self.assertAllEqual(resumed_state['perm'], state['perm'])
+        self.assertAllEqual(resumed_state['rng'][1], state['rng'][1])
+
+if __name__ == '__main__':
+    tf.test.main()
@@ -0,0 +1,46 @@
+import unittest
+import tempfile
+import random
+
+import sys
+sys.path.append('../')
+
+from tasks.cnn.proc import CNNDict, process_set, process_set_parallel
+
+
+def new_vocab():
+    vocab = CNNDict(['PAD', 'UNK'])
+    vocab.metadata = { 'clen' : 0, 'qlen' : 0 }
+    return vocab
+
+
+class CNNProcTest(unittest.TestCase):
+
+    def test_parallel(self):
+        rng = random.Random(0)
+        words = [ 'w{}'.format(i) for i in range(50) ] + [ '@entity1', '@entity2' ]
+        sentence = lambda n : ' '.join( rng.choice(words) for _ in range(n) )
+
+        dirname = tempfile.mkdtemp()
+        for i in range(25):
+            with open('{}/{}.question'.format(dirname, i), 'w') as f:
+                f.write('\n\n'.join([ 'http://url/{}'.format(i), 
+                    sentence(rng.randint(5, 40)), sentence(rng.randint(3, 8)),
+                    '@entity1', '@entity1:a\n@entity2:b' ]) + '\n')
+
+        data, vocab = process_set(dirname, new_vocab(), workers=1)
+        pdata, pvocab = process_set_parallel(dirname, new_vocab(), 
+                workers=2, shard_size=4)
+
+        self.assertEqual(len(data['context']), 25)
+        # same vocabulary, counts, metadata and vectors
+        self.assertEqual(pvocab.word2idx, vocab.word2idx)
+        self.assertEqual(pvocab.word_counter, vocab.word_counter)
+        self.assertEqual(pvocab.metadata, vocab.metadata)
+        self.assertEqual(pdata, data)
+
+        self.assertRaises(ValueError, process_set_parallel, dirname, new_vocab(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
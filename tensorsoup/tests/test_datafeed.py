@@ -0,0 +1,147 @@
+import unittest
+import numpy as np
+
+import sys
+sys.path.append('../')
+
+from datafeed import *
+
+
+class DataFeedTest(unittest.TestCase):
+
+    def test_prefetch(self):
+        data = { 'x' : list(range(10)), 'y' : list(range(10, 20)) }
+        feed = DataFeed(['x', 'y'], data=data)
+
+        prefetcher = feed.prefetch(batch_size=5, size=2)
+        self.assertEqual(prefetcher.getN(), 10)
+
+        # batches arrive in the same order as next_batch
+        self.assertEqual(prefetcher.next_batch(5), [[0,1,2,3,4], [10,11,12,13,14]])
+        self.assertEqual(prefetcher.next_batch(5), [[5,6,7,8,9], [15,16,17,18,19]])
+        self.assertEqual(prefetcher.next_batch(5)[0], [0,1,2,3,4])
+
+        self.assertEqual(prefetcher.num_batches, 3)
+        self.assertTrue(prefetcher.wait_time >= 0.)
+        prefetcher.close()
+
+    def test_prefetch_error(self):
+        batches = iter([ [[0]], [[1]] ])
+        prefetcher = Prefetcher(lambda : next(batches), n=2, batch_size=1)
+
+        # prepared batches first, then the error on every call
+        self.assertEqual(prefetcher.next_batch(1), [[0]])
+        self.assertEqual(prefetcher.next_batch(1), [[1]])
+        for _ in range(2):
+            self.assertRaises(StopIteration, prefetcher.next_batch, 1)
+
+        # batch size is fixed
+        self.assertRaises(AssertionError, prefetcher.next_batch, 2)
+
+    def test_shuffle(self):
+        data = { 'x' : np.arange(10), 'y' : list(range(10, 20)) }
+        feed = DataFeed(['x', 'y'], data=data, shuffle=True)
+
+        epochs = []
+        for _ in range(3):
+            x = []
+            for _ in range(5):
+                xi, yi = feed.next_batch(2)
+                # rows stay aligned across fields
+                self.assertEqual(list(xi + 10), yi)
+                x.extend(xi)
+            # every example once per epoch
+            self.assertEqual(sorted(x), list(range(10)))
+            epochs.append(x)
+
+        # data is not reordered
+        self.assertEqual(list(data['x']), list(range(10)))
+
+    def test_state(self):
+        data = { 'x' : np.arange(10) }
+        feed = DataFeed(['x'], data=data, shuffle=True)
+        prefetcher = feed.prefetch(batch_size=4, size=3)
+
+        prefetcher.next_batch()
+        # position after last batch handed out
+        state = prefetcher.state()
+        batches = [ prefetcher.next_batch()[0].tolist() for _ in range(4) ]
+
+        # same batches (across epochs) after restore
+        prefetcher.restore(state)
+        self.assertEqual([ prefetcher.next_batch()[0].tolist() for _ in range(4) ],
+                batches)
+        prefetcher.close()
+
+    def test_bucket_feed(self):
+        lens = [1, 9, 2, 8, 3, 7, 4, 6]
+        data = { 'x' : [ [i+1]*l for i,l in enumerate(lens) ],
+                 'y' : np.arange(8) }
+
+        feed = BucketFeed(['x', 'y'], data=data, num_buckets=4)
+
+        seen = []
+        for _ in range(4):
+            x, y = feed.next_batch(2)
+            # padded to batch maximum
+            self.assertEqual(x.shape[1], max(lens[i] for i in y))
+            # similar lengths in a batch
+            self.assertTrue(abs(lens[y[0]] - lens[y[1]]) <= 1)
+            seen.extend(y)
+
+        # each example once per epoch
+        self.assertEqual(sorted(seen), list(range(8)))
+
+    def test_bucket_trim(self):
+        # padded to dataset maximum (6 x 4)
+        x = np.zeros([4, 6, 4], dtype=np.int32)
+        for i, (m, l) in enumerate([ (1, 1), (2, 3), (5, 2), (6, 4) ]):
+            x[i, :m, :l] = i + 1
+        data = { 'x' : x, 'y' : np.arange(4), 'unused' : [ [1] ]*4 }
+
+        feed = BucketFeed(['x', 'y'], data=data, num_buckets=2)
+        for _ in range(2):
+            xi, yi = feed.next_batch(2)
+            # trimmed to batch maximum
+            self.assertEqual(xi.shape[1], max( (x[i] != 0).any(axis=1).sum() for i in yi ))
+            self.assertEqual(xi.shape[2], max( (x[i] != 0).any(axis=0).sum() for i in yi ))
+            self.assertTrue((xi == x[yi][:, :xi.shape[1], :xi.shape[2]]).all())
+
+        # fixed shapes
+        feed = BucketFeed(['x', 'y'], data=data, num_buckets=2, trim=False)
+        self.assertEqual(feed.next_batch(2)[0].shape, (2, 6, 4))
+
+    def test_bucket_remainder(self):
+        data = { 'x' : [ [i+1]*(i+1) for i in range(10) ], 'y' : np.arange(10) }
+
+        # n not divisible by batch_size -> incomplete batch dropped
+        feed = BucketFeed(['x', 'y'], data=data, num_buckets=2)
+        for _ in range(3):
+            seen = []
+            for _ in range(2):
+                x, y = feed.next_batch(4)
+                self.assertEqual(len(y), 4)
+                seen.extend(y)
+            # no example twice in an epoch
+            self.assertEqual(len(set(seen)), 8)
+            self.assertEqual(feed.offset, len(feed.batches))
+
+        # base interface
+        feed.new_epoch()
+        self.assertEqual(len(feed.batches), 2)
+
+        # n < batch_size -> one partial batch
+        small = { k : v[:3] for k,v in data.items() }
+        feed = BucketFeed(['x', 'y'], data=small, num_buckets=2)
+        for _ in range(2):
+            x, y = feed.next_batch(4)
+            self.assertEqual(sorted(y), [0, 1, 2])
+            self.assertEqual(x.shape, (3, 3))
+
+        # no examples
+        feed = BucketFeed(['x', 'y'], data={ 'x' : [], 'y' : np.arange(0) })
+        self.assertRaises(ValueError, feed.next_batch, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
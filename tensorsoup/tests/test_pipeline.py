@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+import tensorflow as tf
+
+import sys
+sys.path.append('../')
+
+from datafeed import DataFeed, BucketFeed
+from pipeline import Pipeline, placeholder
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_arrays(self):
+        data = { 'x' : np.arange(10), 'y' : np.arange(10, 20) }
+        pipeline = Pipeline(DataFeed(['x', 'y'], data=data, shuffle=True),
+                batch_size=3)
+
+        with tf.Graph().as_default(), tf.Session() as sess:
+            x = placeholder(tf.int32, [None], name='x', inputs=pipeline)
+            y = placeholder(tf.int32, [None], name='y', inputs=pipeline)
+            pipeline.initialize(sess)
+
+            seen = []
+            for _ in range(3):
+                xi, yi = sess.run([x, y])
+                # rows stay aligned across fields
+                self.assertEqual((xi + 10).tolist(), yi.tolist())
+                seen.extend(xi)
+            # no repeats within epoch
+            self.assertEqual(len(set(seen)), 9)
+
+            # placeholders still take a feed_dict
+            self.assertEqual(sess.run(x, { x : [7] }).tolist(), [7])
+
+    def test_generator(self):
+        lens = [1, 9, 2, 8, 3, 7, 4, 6]
+        data = { 'x' : [ [i+1]*l for i,l in enumerate(lens) ],
+                 'y' : np.arange(8) }
+        pipeline = Pipeline(BucketFeed(['x', 'y'], data=data, num_buckets=4),
+                batch_size=2)
+
+        with tf.Graph().as_default(), tf.Session() as sess:
+            x = placeholder(tf.int32, [None, None], name='x', inputs=pipeline)
+            y = placeholder(tf.int32, [None], name='y', inputs=pipeline)
+            pipeline.initialize(sess)
+
+            for _ in range(4):
+                xi, yi = sess.run([x, y])
+                # padded to batch maximum
+                self.assertEqual(xi.shape[1], max(lens[i] for i in yi))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from functools import partial
+
+import sys
+sys.path.append('../')
+
+from nltk import word_tokenize
+
+from tasks.squad.proc import align, answer_span, QUOTES
+
+
+# single line -> no sentence splitter (punkt) needed
+tokenize = partial(word_tokenize, preserve_line=True)
+
+
+CONTEXTS = [
+        'He said "hello, world" and left (quietly).',
+        'The U.S. team didn\'t win; "we\'ll be back," they said.',
+        'She wrote \'\'It\'\' in 1990s, then "It" again.',
+        'Prices rose 5% in Q3 -- a record -- and fell.',
+        ]
+
+
+class SquadProcTest(unittest.TestCase):
+
+    def spans(self, context):
+        tokens = tokenize(context)
+        return tokens, align(context, tokens)
+
+    def test_align(self):
+        for context in CONTEXTS:
+            tokens, (starts, ends) = self.spans(context)
+            for token, s, e in zip(tokens, starts, ends):
+                if context[s:e] != token:
+                    # rewritten quote -> original quote chars
+                    self.assertTrue(token in QUOTES)
+                    self.assertTrue(context[s:e] in QUOTES + ['"'])
+            # spans are ordered, non-overlapping
+            self.assertTrue(all( e <= s for e, s in zip(ends, starts[1:]) ))
+
+    def test_align_no_jump(self):
+        # closing quote must not match the literal '' further on
+        text = 'a "b" c \'\' d'
+        starts, ends = align(text, [ 'a', '``', 'b', "''", 'c', "''", 'd' ])
+        self.assertEqual(starts, [ 0, 2, 3, 4, 6, 8, 11 ])
+        self.assertEqual(ends, [ 1, 3, 4, 5, 7, 10, 12 ])
+
+    def test_answer_span(self):
+        # answers on token boundaries -> same as
+        #  tokenizing the context up to the answer
+        agreed = 0
+        for context in CONTEXTS:
+            tokens, (starts, ends) = self.spans(context)
+            for i in range(len(tokens)):
+                for j in range(i, min(i+4, len(tokens))):
+                    sch_pos, ech_pos = starts[i], ends[j]
+                    self.assertEqual(answer_span(starts, ends, sch_pos, ech_pos),
+                            (i, j))
+                    before = tokenize(context[:sch_pos])
+                    upto = tokenize(context[:ech_pos])
+                    if (len(before), len(upto) - 1) == (i, j):
+                        agreed += 1
+                    else:
+                        # prefix tokenized differently from context
+                        #  ('U.S.' at the end of a prefix -> 'U.S', '.')
+                        self.assertTrue(before != tokens[:i] 
+                                or upto != tokens[:j+1])
+        self.assertTrue(agreed > 100)
+
+    def test_answer_mid_token(self):
+        context = 'They met in the 1990s, in U.S. cities.'
+        tokens, (starts, ends) = self.spans(context)
+        i = tokens.index('1990s')
+
+        # '990s' -> span covers '1990s'
+        #  (tokenizing context[:pos] would start after it)
+        sch_pos = context.index('990s')
+        self.assertEqual(answer_span(starts, ends, sch_pos, sch_pos + 4),
+                (i, i))
+        # '1990' -> ends inside '1990s'
+        sch_pos = context.index('1990')
+        self.assertEqual(answer_span(starts, ends, sch_pos, sch_pos + 4),
+                (i, i))
+        # 'S. cities' -> from 'U.S.' to 'cities'
+        sch_pos = context.index('S. cities')
+        self.assertEqual(answer_span(starts, ends, sch_pos, sch_pos + 9),
+                (tokens.index('U.S.'), tokens.index('cities')))
+
+
+if __name__ == '__main__':
+    unittest.main()
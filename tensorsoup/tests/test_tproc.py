@@ -0,0 +1,97 @@
+import unittest
+import tempfile
+import numpy as np
+
+import sys
+sys.path.append('../')
+
+from tproc.ragged import Ragged
+from tproc import store
+from tproc.dictionary import Dictionary
+from tproc.glove import Glove
+
+
+class TprocTest(unittest.TestCase):
+
+    def test_ragged(self):
+        seqs = [ [[1,2], [3]], [[4,5,6]], [] ]
+        r = Ragged.from_list(seqs)
+
+        self.assertEqual(r.levels, 2)
+        self.assertEqual(len(r), 3)
+        self.assertEqual(r.tolist(), seqs)
+        self.assertEqual(r[[1,0]].tolist(), [ seqs[1], seqs[0] ])
+
+    def test_ragged_pad(self):
+        r = Ragged.from_list([ [[1,2], [3]], [[4,5,6]], [] ])
+
+        # longest per level
+        padded = r.pad()
+        self.assertEqual(padded.shape, (3, 2, 3))
+        self.assertEqual(padded.dtype, np.uint8)
+        self.assertEqual(padded[0].tolist(), [[1,2,0], [3,0,0]])
+        self.assertEqual(padded[2].sum(), 0)
+
+        # truncate
+        self.assertEqual(r.pad([1, 2], PAD=9)[:2].tolist(), [[[1,2]], [[4,5]]])
+        # grow to fit
+        self.assertEqual(r.pad([1, 2], truncate=False).shape, (3, 2, 3))
+
+    def test_store(self):
+        splits = { 'train' : {
+            'context' : [ [[1,2], [3]], [[4,5,6]] ],
+            'query' : [ [1,2,3], [4] ],
+            'answer' : [ 7, 8 ],
+            'tokens' : [ ['a', 'bb'], ['ccc'] ]
+            } }
+
+        path = tempfile.mkdtemp()
+        store.save(path, splits)
+        self.assertTrue(store.exists(path))
+
+        loaded = store.load(path)['train']
+        # dense fields are memory-mapped
+        self.assertTrue(isinstance(loaded['answer'], np.memmap))
+        for k, v in splits['train'].items():
+            self.assertEqual(list(loaded[k]), list(v))
+
+    def test_dictionary(self):
+        d = Dictionary(['PAD', 'UNK'])
+        d.add_words('the cat sat on the mat'.split())
+
+        self.assertEqual(d.size, 7)
+        self.assertEqual(d.wordCount('the'), 2)
+        self.assertEqual(d.index('cat'), 3)
+        self.assertEqual(d.index('dog'), 1)
+        self.assertEqual(d.index('cand5'), 5)
+
+        words = 'the dog sat cand4'.split()
+        expected = [ d.index(w) for w in words ]
+        self.assertEqual(list(d.index_many(words)), expected)
+
+        # vectorized lookup after freeze
+        d.freeze()
+        self.assertEqual(list(d.index_many(words)), expected)
+        self.assertRaises(ValueError, d.add_word, 'dog')
+
+    def test_glove(self):
+        path = tempfile.mkdtemp()
+        glove_file = path + '/glove.test.3d.txt'
+        with open(glove_file, 'w') as f:
+            f.write('the 0.1 0.2 0.3\ncat 1 2 3\nmat -1 -2 -3\n')
+
+        # first load parses text, second maps binary cache
+        for _ in range(2):
+            glove = Glove.load(glove_file)
+            self.assertEqual((len(glove), glove.dim), (3, 3))
+            self.assertTrue('cat' in glove and 'dog' not in glove)
+            self.assertEqual(glove['mat'].tolist(), [-1, -2, -3])
+        self.assertTrue(isinstance(glove.vectors, np.memmap))
+
+        glove = glove.subset(['mat', 'dog', 'the'])
+        self.assertEqual(glove.words, ['mat', 'the'])
+        self.assertEqual(glove['mat'].tolist(), [-1, -2, -3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,6 @@
+import re
+import numpy as np
+
 import logging
 log = logging.getLogger('tasks.cnn.proc')
 log.setLevel(logging.DEBUG)
@@ -16,6 +19,11 @@ class Dictionary(object):
         self.idx2word = []
         self.size  = 0
         self.word_counter = {}
+
+        # sorted words and their indices (see freeze)
+        self.frozen = False
+        self.sorted_words = None
+        self.sorted_idx = None
     
         self.add_words(initial_vocab)
 
@@ -25,7 +33,10 @@ class Dictionary(object):
         Dictionary.count += 1
                 
     def add_word(self, word):
-        if self.is_worthy(word) and word not in self.idx2word:
+        if self.frozen:
+            raise ValueError('{} is frozen'.format(self.name))
+
+        if self.is_worthy(word) and word not in self.word2idx:
             self.idx2word.append(word)
             self.word2idx[word] = self.size
             self.size += 1
@@ -36,8 +47,8 @@ class Dictionary(object):
             self.word_counter[word] = 1
 
     
-    def add_words(self, words):
-        for word in tqdm(words):
+    def add_words(self, words, verbose=False):
+        for word in (tqdm(words) if verbose else words):
             self.add_word(word)
         
     def word(self, idx):
@@ -46,14 +57,50 @@ class Dictionary(object):
     
     def index(self, word, pattern='cand(\d+)'):
         if self.is_worthy(word):
-            if word in self.idx2word:
-                return self.idx2word.index(word)
-            elif re.search(patten, word):
-                match = re.search(pattern, word)
-                if match:
-                    return int(match.group(1))
-
-        return self.idx2word.index('UNK')
+            if word in self.word2idx:
+                return self.word2idx[word]
+            match = re.search(pattern, word)
+            if match:
+                return int(match.group(1))
+
+        return self.word2idx['UNK']
+
+    def index_many(self, words):
+        '''
+            index a list of tokens -> np.array(int32)
+
+             frozen dictionaries look up all tokens at once
+              (binary search over sorted words)
+        '''
+        if not self.frozen:
+            return np.array([ self.index(w) for w in words ], dtype=np.int32)
+
+        words = np.asarray(words)
+        if not len(words):
+            return np.zeros([0], dtype=np.int32)
+
+        pos = np.minimum(np.searchsorted(self.sorted_words, words), 
+                self.size - 1)
+        found = (self.sorted_words[pos] == words)
+        indices = self.sorted_idx[pos]
+
+        # rare misses -> worthiness, candidate pattern, UNK
+        for i in np.flatnonzero(~found):
+            indices[i] = self.index(str(words[i]))
+
+        return indices
+
+    def freeze(self):
+        '''
+            stop adding words; keep a sorted array of words
+             with their indices for vectorized lookup
+        '''
+        words = np.array(self.idx2word)
+        order = np.argsort(words, kind='mergesort')
+        self.sorted_words = words[order]
+        self.sorted_idx = order.astype(np.int32)
+        self.frozen = True
+        return self
                 
 
     # check if a word is worthy
@@ -82,7 +129,7 @@ def buildDictionary(intial_vocab=[], max_len = 30, *args):
         text = flatten(text)
         text = [ t.split() for t in text ]
         text = set(flatten(text))
-        dictionary.add_words(list(text))
+        dictionary.add_words(list(text), verbose=True)
             
     return dictionary
 
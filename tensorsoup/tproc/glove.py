@@ -0,0 +1,95 @@
+'''
+    GloVe vectors as a binary, memory-mapped matrix
+
+    the text file is parsed once and cached next to it
+        glove.6B.100d.float32.npy  (matrix, one row per word)
+        glove.6B.100d.words.json   (words, in row order)
+
+    later loads map the matrix with np.load(mmap_mode='r'),
+     so only rows that are looked up are paged in
+
+'''
+import json
+import os
+
+import numpy as np
+
+
+def cache_files(glove_file, dtype=np.float32):
+    base = os.path.splitext(glove_file)[0]
+    return ('{}.{}.npy'.format(base, np.dtype(dtype).name),
+            base + '.words.json')
+
+
+def convert(glove_file, dtype=np.float32):
+    '''
+        convert(str : glove_file) -> (list : words, np.ndarray : vectors)
+            parse text file and write binary cache
+    '''
+    matrix_file, words_file = cache_files(glove_file, dtype)
+
+    words, vectors = [], []
+    with open(glove_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            values = line.split()
+            words.append(values[0])
+            vectors.append(np.array(values[1:], dtype=dtype))
+
+    vectors = np.stack(vectors)
+
+    # write words last -> marks cache as complete
+    np.save(matrix_file, vectors)
+    with open(words_file, 'w') as f:
+        json.dump(words, f)
+
+    return words, vectors
+
+
+class Glove(object):
+    '''
+        word -> vector lookup over a (memory-mapped) matrix
+
+        [usage]
+        glove = Glove.load('glove.6B.100d.txt')
+        glove['ocelot'] -> np.ndarray [100]
+        glove = glove.subset(vocabulary)  # keep only needed rows
+    '''
+    def __init__(self, words, vectors):
+        self.words = words
+        self.vectors = vectors
+        self.w2i = { w:i for i,w in enumerate(words) }
+
+    @classmethod
+    def load(cls, glove_file, dtype=np.float32, mmap_mode='r'):
+        matrix_file, words_file = cache_files(glove_file, dtype)
+
+        # first load -> build binary cache
+        if not (os.path.isfile(matrix_file) and os.path.isfile(words_file)):
+            print('Converting {} to {}'.format(glove_file, matrix_file))
+            return cls(*convert(glove_file, dtype))
+
+        with open(words_file) as f:
+            words = json.load(f)
+        return cls(words, np.load(matrix_file, mmap_mode=mmap_mode))
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.w2i
+
+    def __getitem__(self, word):
+        return self.vectors[self.w2i[word]]
+
+    def subset(self, vocabulary):
+        '''
+            keep rows of words in vocabulary
+             (copied into memory)
+        '''
+        words = [ w for w in sorted(set(vocabulary)) if w in self.w2i ]
+        idx = np.array([ self.w2i[w] for w in words ], dtype=np.int64)
+        return Glove(words, np.asarray(self.vectors[idx]))
@@ -0,0 +1,174 @@
+import numpy as np
+
+
+def depth(seqs):
+    '''
+        depth(list : seqs) -> int
+            num of nested list levels,
+             decided by the first non-empty item
+    '''
+    d, level = 0, seqs
+    while isinstance(level, (list, tuple)):
+        d += 1
+        level = next(( item for item in level
+            if not isinstance(item, (list, tuple)) or len(item) ), None)
+    return d
+
+
+def smallest_int_dtype(lo, hi):
+    '''
+        smallest integer dtype that holds [lo, hi]
+    '''
+    dtypes = [ np.uint8, np.uint16 ] if lo >= 0 else [ np.int8, np.int16 ]
+    for dtype in dtypes + [ np.int32, np.int64 ]:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+
+
+def ranges(starts, lens):
+    '''
+        concatenated aranges 
+         [starts[0], starts[0]+lens[0]), [starts[1], ...), ...
+    '''
+    shift = np.repeat(starts - np.cumsum(lens) + lens, lens)
+    return shift + np.arange(lens.sum(), dtype=np.int64)
+
+
+class Ragged(object):
+    '''
+        nested sequences of variable length
+         stored as flat values plus offsets
+
+        offsets[0] splits rows into items of the next level;
+         offsets[-1] splits the last level into values
+
+        strings are stored as indices into 'vocab'
+         (unique strings) to keep values fixed-width
+
+        [usage]
+        r = Ragged.from_list([[1,2,3], [4]])
+        r.values -> [1,2,3,4]; r.offsets -> [[0,3,4]]
+        r.pad() -> [[1,2,3], [4,0,0]] (uint8)
+    '''
+    def __init__(self, values, offsets, vocab=None):
+        self.values = values
+        self.offsets = offsets
+        self.vocab = vocab
+
+    @classmethod
+    def from_list(cls, seqs, dtype=None):
+        if isinstance(seqs, Ragged):
+            return seqs
+
+        offsets, level = [], list(seqs)
+        for _ in range(depth(seqs) - 1):
+            lens = [ len(item) for item in level ]
+            offsets.append(np.concatenate([[0], np.cumsum(lens)]).astype(np.int64))
+            # flatten one level
+            level = [ item for items in level for item in items ]
+
+        values, vocab = np.array(level, dtype=dtype), None
+        # keep indices compact
+        if dtype is None and values.dtype.kind == 'i':
+            values = values.astype(np.int32)
+        # strings -> indices into vocab
+        if values.dtype.kind in 'US':
+            vocab, values = np.unique(values, return_inverse=True)
+            values = values.astype(np.int32)
+
+        return cls(values, offsets, vocab)
+
+    @property
+    def levels(self):
+        return len(self.offsets)
+
+    @property
+    def dtype(self):
+        return self.values.dtype if self.vocab is None else self.vocab.dtype
+
+    def __len__(self):
+        return len(self.offsets[0]) - 1
+
+    def row(self, i, level=0):
+        s, e = self.offsets[level][i], self.offsets[level][i+1]
+        # bottom of hierarchy
+        if level == self.levels - 1:
+            if self.vocab is not None:
+                return self.vocab[self.values[s:e]].tolist()
+            return self.values[s:e].tolist()
+        return [ self.row(j, level+1) for j in range(s, e) ]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(range(*i.indices(len(self))))
+        if isinstance(i, (list, range, np.ndarray)):
+            return self.take(i)
+        return self.row(i if i >= 0 else len(self) + i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def lengths(self, level=0):
+        return np.diff(self.offsets[level])
+
+    def maxlens(self):
+        return [ int(self.lengths(level).max()) if len(self.offsets[level]) > 1 
+                else 0 for level in range(self.levels) ]
+
+    def take(self, idx):
+        '''
+            select rows -> Ragged
+             copies only the values of selected rows
+        '''
+        idx = np.asarray(idx, dtype=np.int64)
+        offsets = []
+        for level_offsets in self.offsets:
+            starts = np.asarray(level_offsets[idx])
+            lens = np.asarray(level_offsets[idx+1]) - starts
+            offsets.append(np.concatenate([[0], np.cumsum(lens)]).astype(np.int64))
+            # items of next level
+            idx = ranges(starts, lens)
+
+        return Ragged(np.asarray(self.values[idx]), offsets, self.vocab)
+
+    def pad(self, maxlens=None, PAD=0, truncate=True, dtype=None):
+        '''
+            pad into array of shape [len] + maxlens
+
+             maxlens  : max length per level (0/None -> longest)
+             truncate : drop items beyond maxlens, otherwise
+                         maxlens grow to fit the longest item
+             dtype    : defaults to smallest integer dtype
+                         that holds values and PAD
+        '''
+        longest = self.maxlens()
+        maxlens = list(maxlens) if maxlens else [0]*self.levels
+        maxlens = [ m if m and (truncate or m >= l) else l 
+                for m, l in zip(maxlens, longest) ]
+
+        if dtype is None:
+            values = self.values
+            lo = min(int(values.min()), PAD) if len(values) else PAD
+            hi = max(int(values.max()), PAD) if len(values) else PAD
+            dtype = smallest_int_dtype(lo, hi)
+
+        # pad bottom level first,
+        #  then gather padded items into each level above
+        out = np.asarray(self.values)
+        for level in reversed(range(self.levels)):
+            offsets = np.asarray(self.offsets[level])
+            grid = np.arange(maxlens[level])
+            lens = np.minimum(np.diff(offsets), maxlens[level])
+            mask = grid < lens[:, None]
+
+            padded = np.full((len(lens), maxlens[level]) + out.shape[1:], PAD, 
+                    dtype=dtype)
+            padded[mask] = out[(offsets[:-1, None] + grid)[mask]]
+            out = padded
+
+        return out
+
+    def tolist(self):
+        return list(self)
@@ -0,0 +1,101 @@
+'''
+    columnar storage for processed datasets
+
+    <path>/
+        manifest.json
+        <split>.<field>.npy            (dense fields)
+        <split>.<field>.values.npy     (ragged fields)
+        <split>.<field>.offsets.<i>.npy
+        <split>.<field>.vocab.npy      (ragged strings)
+
+    fields are loaded with np.load(mmap_mode='r'), so
+     processes on the same machine share page cache
+      instead of holding unpickled copies
+
+'''
+import json
+import os
+
+import numpy as np
+
+from tproc.ragged import Ragged, depth
+
+
+MANIFEST = 'manifest.json'
+
+
+def exists(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def save_field(path, name, value):
+    # dense -> single array
+    if isinstance(value, np.ndarray) or depth(value) == 1:
+        value = np.asarray(value)
+        np.save(os.path.join(path, name + '.npy'), value)
+        return { 'kind' : 'dense', 'dtype' : value.dtype.str,
+                'shape' : list(value.shape) }
+
+    # ragged -> flat values plus offsets
+    value = Ragged.from_list(value)
+    np.save(os.path.join(path, name + '.values.npy'), value.values)
+    for i, offsets in enumerate(value.offsets):
+        np.save(os.path.join(path, '{}.offsets.{}.npy'.format(name, i)), offsets)
+    if value.vocab is not None:
+        np.save(os.path.join(path, name + '.vocab.npy'), value.vocab)
+    return { 'kind' : 'ragged', 'dtype' : value.dtype.str,
+            'levels' : value.levels, 'vocab' : value.vocab is not None }
+
+
+def load_field(path, name, entry, mmap_mode='r'):
+    load = lambda f : np.load(os.path.join(path, f), mmap_mode=mmap_mode)
+
+    if entry['kind'] == 'dense':
+        return load(name + '.npy')
+
+    return Ragged(load(name + '.values.npy'),
+            [ load('{}.offsets.{}.npy'.format(name, i))
+                for i in range(entry['levels']) ],
+            load(name + '.vocab.npy') if entry['vocab'] else None)
+
+
+def save(path, splits):
+    '''
+        save(str : path, dict : splits)
+            splits -> { split : { field : list | np.ndarray } }
+    '''
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    manifest = {}
+    for split, fields in splits.items():
+        manifest[split] = {}
+        for field, value in fields.items():
+            name = '{}.{}'.format(split, field)
+            manifest[split][field] = save_field(path, name, value)
+
+    # write manifest last -> marks store as complete
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def load_split(path, split, mmap_mode='r', entries=None):
+    '''
+        load fields of a single split
+    '''
+    entries = entries if entries else manifest(path)[split]
+    return { field : load_field(path, '{}.{}'.format(split, field),
+                entry, mmap_mode)
+            for field, entry in entries.items() }
+
+
+def load(path, mmap_mode='r'):
+    return { split : load_split(path, split, mmap_mode, entries)
+            for split, entries in manifest(path).items() }
@@ -2,6 +2,8 @@ import numpy as np
 import os
 import pickle
 
+from tproc.ragged import Ragged
+
 
 def is_word(w):
     '''
@@ -61,19 +63,11 @@ def pad_sequences(seqs, maxlens, metadata):
 
     PAD, w2i = metadata['special_tokens'][0], metadata['w2i']
     PAD = w2i[PAD]
-    
-    def pad_seq(seq):
-        if type(seq[0]) is not list:
-            return seq + [PAD]*(maxlens[-1]-len(seq))
 
-        if len(seq) > maxlens[-2]:
-            padded_seq = seq[:maxlens[0]]
-        else:
-            padded_seq = seq + [[PAD]*maxlens[-1]]*(maxlens[0]-len(seq))
-
-        return [ pad_seq(s) for s in padded_seq ]
-    
-    return np.array([ pad_seq(seq) for seq in seqs ])
+    # maxlens of innermost levels;
+    #  top level is truncated to maxlens[0]
+    seqs = Ragged.from_list(seqs)
+    return seqs.pad(maxlens[-seqs.levels:], PAD=PAD)
 
 def list_of_files(path):
     return [ path + '/' + fname for fname in os.listdir(path) ]
@@ -145,20 +139,9 @@ def pad_seq(seqs, maxlen=0, PAD=0, truncate=False):
 
     # pad sequence with PAD
     #  if seqs is a list of lists
-    if type(seqs[0]) == type([]):
-
-        # get maximum length of sequence
-        maxlen = maxlen if maxlen else seq_maxlen(seqs)
-
-        def pad_seq_(seq):
-            if truncate and len(seq) > maxlen:
-                # truncate sequence
-                return seq[:maxlen]
-
-            # return padded
-            return seq + [PAD]*(maxlen-len(seq))
-
-        seqs = [ pad_seq_(seq) for seq in seqs ]
+    if isinstance(seqs, Ragged) or type(seqs[0]) == type([]):
+        return Ragged.from_list(seqs).pad([maxlen], PAD=PAD, 
+                truncate=truncate)
     
     # return numpy array
     return np.array(seqs, dtype=np.int32)
@@ -0,0 +1,117 @@
+import os
+import pickle
+import threading
+
+import tensorflow as tf
+
+from graph import Snapshot
+
+
+class Checkpointer(object):
+    '''
+        periodic checkpoints written in background
+
+         model variables and optimizer slots (global variables)
+          are copied to in-graph shadows in one op; a worker thread
+           then writes the shadows to disk while training goes on
+
+         the checkpoint maps original variable names to shadows,
+          so it restores with a plain tf.train.Saver as well
+
+         training state (epoch, step, feed position/permutation)
+          goes to a sidecar '<checkpoint>.state' (pickle), written
+           before the checkpoint is registered as latest
+
+        [usage]
+        ckpt = Checkpointer('ckpt/', keep=3)
+        ckpt.save(sess, step, state)
+        state = ckpt.restore(sess)  # latest or None
+
+    '''
+    def __init__(self, path, keep=3, variables=None, name='model'):
+        self.path = path
+        self.prefix = os.path.join(path, name)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self.variables = variables if variables is not None else tf.global_variables()
+        # built once
+        self.snapshot = Snapshot(self.variables, name='checkpoint')
+        self.saver = tf.train.Saver({ var.op.name : shadow
+            for var, shadow in zip(self.variables, self.snapshot.shadows) },
+            max_to_keep=keep)
+        self.restorer = tf.train.Saver({ var.op.name : var
+            for var in self.variables })
+
+        # resumed run -> keep pruning old checkpoints
+        ckpt = tf.train.get_checkpoint_state(path)
+        if ckpt:
+            self.saver.recover_last_checkpoints(ckpt.all_model_checkpoint_paths)
+
+        self.keep = keep
+        self._worker = None
+        self._error = None
+
+    @classmethod
+    def of(cls, model, path, keep=3, variables=None):
+        # one checkpointer per model and path
+        if getattr(model, 'checkpointers', None) is None:
+            model.checkpointers = {}
+        if path not in model.checkpointers:
+            model.checkpointers[path] = cls(path, keep, variables)
+        return model.checkpointers[path]
+
+    def save(self, sess, step, state=None):
+        # one write at a time
+        #  shadows must not change while being written
+        self.wait()
+        self.snapshot.save(sess)
+
+        self._worker = threading.Thread(target=self._write,
+                args=(sess, step, state))
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _write(self, sess, step, state):
+        try:
+            filename = '{}-{}'.format(self.prefix, step)
+            with open(filename + '.state', 'wb') as handle:
+                pickle.dump(state, handle, pickle.HIGHEST_PROTOCOL)
+
+            self.saver.save(sess, self.prefix, global_step=step,
+                    write_meta_graph=False)
+
+            # drop states of removed checkpoints
+            kept = set(self.saver.last_checkpoints)
+            for f in os.listdir(self.path):
+                if f.endswith('.state') and os.path.join(self.path, f[:-6]) not in kept:
+                    os.remove(os.path.join(self.path, f))
+
+        except Exception as e:
+            # surface in main thread
+            self._error = e
+
+    def wait(self):
+        if self._worker:
+            self._worker.join()
+            self._worker = None
+        if self._error:
+            error, self._error = self._error, None
+            raise error
+
+    def latest(self):
+        return tf.train.latest_checkpoint(self.path)
+
+    def restore(self, sess, checkpoint=None):
+        '''
+            restore variables from checkpoint (default : latest)
+             returns training state or None
+        '''
+        self.wait()
+        checkpoint = checkpoint if checkpoint else self.latest()
+        if not checkpoint:
+            return None
+
+        self.restorer.restore(sess, checkpoint)
+        with open(checkpoint + '.state', 'rb') as handle:
+            return pickle.load(handle)
@@ -0,0 +1,98 @@
+import json
+import time
+
+from collections import deque, OrderedDict
+
+import numpy as np
+
+
+class StepTimer(object):
+    '''
+        per-step time breakdown
+
+         a step is split into phases by mark(); each phase lasts
+          from the previous mark (or start) to its own mark
+           fetch -> feed_dict -> run -> summary
+
+         the last 'window' runs are kept; every 'interval' steps,
+          percentiles of each phase, examples/sec and tokens/sec
+           are written as a JSON line to 'path' and as scalars
+            to the visualizer (if any)
+
+        [usage]
+        timer = StepTimer(path='log/steps.jsonl')
+        trainer = Trainer(sess, model, feed, timer=timer)
+
+    '''
+    PHASES = [ 'fetch', 'feed_dict', 'run', 'summary' ]
+
+    def __init__(self, window=100, interval=100, path=None,
+            percentiles=[50, 90, 99], count_tokens=None):
+        self.window = window
+        self.interval = interval
+        self.path = path
+        self.percentiles = percentiles
+        # batch -> num of tokens
+        self.count_tokens = count_tokens if count_tokens else num_tokens
+
+        self.times = OrderedDict([ (phase, deque(maxlen=window))
+            for phase in self.PHASES + ['total'] ])
+        self.examples = deque(maxlen=window)
+        self.tokens = deque(maxlen=window)
+
+        # latest report
+        self.summary = None
+        # step of previous end()
+        self.last_step = None
+
+    def start(self):
+        self._start = self._last = time.perf_counter()
+        self._step = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self._step[phase] = now - self._last
+        self._last = now
+
+    def end(self, step, batch, batch_size, visualizer=None):
+        for phase in self.PHASES:
+            self.times[phase].append(self._step.get(phase, 0.))
+        self.times['total'].append(self._last - self._start)
+        self.examples.append(batch_size)
+        self.tokens.append(self.count_tokens(batch))
+
+        # report once a multiple of interval is crossed
+        #  (steps advance by k with k steps per run)
+        last = self.last_step if self.last_step is not None else step - 1
+        self.last_step = step
+        if step // self.interval > last // self.interval:
+            self.report(step, visualizer)
+
+    def report(self, step, visualizer=None):
+        total = sum(self.times['total'])
+        summary = OrderedDict([ ('step', step) ])
+        for phase, times in self.times.items():
+            for p, value in zip(self.percentiles,
+                    np.percentile(times, self.percentiles)):
+                summary['{}_p{}'.format(phase, p)] = float(value)
+        summary['examples_per_sec'] = sum(self.examples)/total
+        summary['tokens_per_sec'] = sum(self.tokens)/total
+        # fraction of step spent waiting on input
+        summary['fetch_fraction'] = sum(self.times['fetch'])/total
+        self.summary = summary
+
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(summary) + '\n')
+
+        if visualizer:
+            visualizer.log_scalars({ 'step_time/' + k : v
+                for k,v in summary.items() if k != 'step' }, step)
+
+        return summary
+
+
+def num_tokens(batch):
+    # non-pad (non-zero) items of integer arrays
+    return sum( int(np.count_nonzero(item)) for item in batch
+            if isinstance(item, np.ndarray) and item.dtype.kind in 'iu' )
@@ -0,0 +1,109 @@
+import os
+
+from collections import defaultdict
+
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+
+class Tracer(object):
+    '''
+        full traces of selected steps
+
+         chosen steps run with FULL_TRACE; each one is written
+          as Chrome trace JSON (chrome://tracing) to
+           '<logdir>/<tag>_step<step>.json'
+
+         training steps ('steps') and evaluation iterations
+          ('eval_steps') are chosen separately; a run of several
+           steps (steps_per_run) is traced if it covers a chosen
+            step, and named by the first one
+
+         op times are accumulated over traced steps and ranked
+          by op, op type and name scope ('memloop', 'g_theta', ..);
+           printed after the last chosen step of fit or evaluate
+
+        [usage]
+        tracer = Tracer(steps=range(100, 106), logdir='trace/')
+        trainer.fit(epochs, tracer=tracer)
+        trainer.evaluate(tracer=Tracer(steps=[], eval_steps=[0]))
+
+    '''
+    def __init__(self, steps, logdir='./trace/', top=15, eval_steps=()):
+        self.steps = { 'train' : set(steps), 'eval' : set(eval_steps) }
+        self.logdir = logdir
+        self.top = top
+        if not os.path.isdir(logdir):
+            os.makedirs(logdir)
+
+        self.options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+
+        # accumulated micro seconds
+        self.ops = defaultdict(int)
+        self.op_types = defaultdict(int)
+        self.scopes = defaultdict(int)
+        self.traced = []
+
+    def __contains__(self, step):
+        return step in self.steps['train']
+
+    def chosen(self, first, last=None, tag='train'):
+        # chosen steps in [first, last]
+        last = first if last is None else last
+        return sorted( step for step in self.steps[tag] if first <= step <= last )
+
+    '''
+        kwargs to sess.run for steps [first, last]
+
+    '''
+    def run_kwargs(self, first, last=None, tag='train'):
+        if not self.chosen(first, last, tag):
+            return {}
+        return { 'options' : self.options, 'run_metadata' : tf.RunMetadata() }
+
+    def collect(self, first, run_metadata, tag='train', last=None):
+        chosen = self.chosen(first, last, tag)
+        step = chosen[0] if chosen else first
+
+        # chrome trace
+        trace = timeline.Timeline(run_metadata.step_stats)
+        filename = os.path.join(self.logdir, '{}_step{}.json'.format(tag, step))
+        with open(filename, 'w') as f:
+            f.write(trace.generate_chrome_trace_format())
+
+        for dev_stats in run_metadata.step_stats.dev_stats:
+            for node in dev_stats.node_stats:
+                name = node.node_name.split(':')[0]
+                if name.startswith('_'):
+                    continue
+                micros = node.all_end_rel_micros
+
+                self.ops[name] += micros
+                # label -> 'name = Type(inputs)'
+                if '=' in node.timeline_label:
+                    op_type = node.timeline_label.split('=')[1].split('(')[0].strip()
+                    self.op_types[op_type] += micros
+                # time of op counts for each enclosing scope
+                scopes = name.split('/')[:-1]
+                for k in range(1, len(scopes)+1):
+                    self.scopes['/'.join(scopes[:k])] += micros
+
+        self.traced.append((tag, step))
+
+        # summary after last chosen step of tag (train, eval)
+        steps = self.steps[tag]
+        if chosen and steps and chosen[-1] == max(steps):
+            self.report()
+
+    def report(self):
+        def rank(times, title):
+            total = float(sum(self.ops.values())) or 1.
+            print(':: {}'.format(title))
+            for name, micros in sorted(times.items(), key=lambda x : -x[1])[:self.top]:
+                print('::   {:10.2f} ms {:6.1%}  {}'.format(micros/1000.,
+                    micros/total, name))
+
+        print(':: Traced {} steps -> {}'.format(len(self.traced), self.logdir))
+        rank(self.ops, 'ops')
+        rank(self.op_types, 'op types')
+        rank(self.scopes, 'name scopes')
@@ -2,7 +2,12 @@ from tqdm import tqdm
 import tensorflow as tf
 import numpy as np
 
+import time
+
 from graph import *
+from train.checkpoint import Checkpointer
+from pipeline import Pipeline
+from datafeed import Prefetcher
 
 
 class Trainer(object):
@@ -14,7 +19,11 @@ class Trainer(object):
     def __init__(self, sess, model,
             trainfeed=None, testfeed=None, # optional data feeds
             lr=0.001,  # learning rate
-            batch_size=1):
+            batch_size=1,
+            checkpoint_dir=None, # periodic checkpoints (background)
+            checkpoint_steps=1000,
+            keep=3, # num of checkpoints to keep
+            timer=None): # StepTimer (step time breakdown)
  
         self.model = model
         self.trainfeed = trainfeed
@@ -23,10 +32,48 @@ class Trainer(object):
         self.batch_size = batch_size
         self.lr = lr
 
+        # seconds spent waiting on feed (last epoch/evaluation)
+        self.input_wait = 0.
+
+        # in-graph copy of best model params
+        #  built by first fit that evaluates (doubles param memory)
+        self.snapshot = None
+
+        # num of training steps (all calls to fit)
+        self.step = 0
+
+        # opt-in step timing
+        self.timer = timer
+
+        # checkpoint variables, optimizer slots and best params
+        #  built by first fit
+        self.checkpointer = None
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_steps = checkpoint_steps
+        self.keep = keep
+        # best params are part of checkpoints
+        self.checkpoint_snapshot = False
+
+
+    def prepare(self, keep_best):
+        # snapshot only if best params are kept
+        if keep_best and self.snapshot is None:
+            self.snapshot = Snapshot.of(self.model)
+
+        if self.checkpoint_dir and self.checkpointer is None:
+            shadows = self.snapshot.shadows if self.snapshot else []
+            self.checkpointer = Checkpointer.of(self.model, self.checkpoint_dir, 
+                    self.keep, tf.global_variables() + shadows)
+            self.checkpoint_snapshot = self.snapshot is not None
+            # best params are checkpointed before first save
+            if self.snapshot:
+                self.sess.run(self.snapshot.init_op)
+
 
     def evaluate(self, feed=None, 
             batch_size=None,
-            visualizer=None):
+            visualizer=None,
+            tracer=None):
 
         # convenience
         model = self.model
@@ -36,6 +83,9 @@ class Trainer(object):
         # set batch size
         batch_size = batch_size if batch_size else self.batch_size
 
+        # batch is split among towers
+        self.check_towers(model.placeholders, batch_size)
+
         # get num of examples
         num_examples = feed.getN()
         # get num of iterations
@@ -43,9 +93,15 @@ class Trainer(object):
 
         # maintain avg loss, accuracy
         avg_loss, avg_acc = 0., 0.
+        # time spent waiting on feed
+        input_wait = 0.
+        if isinstance(feed, Prefetcher):
+            feed.reset_stats()
         for i in range(num_iterations):
             # get next batch
+            start = time.time()
             bi = feed.next_batch(batch_size)
+            input_wait += time.time() - start
 
             # fetch loss and accuracy from graph
             fetch_data = [model.loss, model.accuracy]
@@ -56,12 +112,16 @@ class Trainer(object):
             
             # build feed_dict
             feed_dict = self.extra_params(
-                    self.build_feed_dict(model.placeholders, bi), # feed_dict
+                    self.build_feed(model.placeholders, bi), # feed_dict
                     self.TEST)
 
             # execute graph in session
+            #  full trace of chosen iterations
+            run_kwargs = tracer.run_kwargs(i, tag='eval') if tracer else {}
             results = self.sess.run( fetch_data,
-                                     feed_dict = feed_dict)
+                                     feed_dict = feed_dict, **run_kwargs)
+            if run_kwargs:
+                tracer.collect(i, run_kwargs['run_metadata'], tag='eval')
             # get loss, accuracy
             l, acc = results[:2]
 
@@ -74,10 +134,13 @@ class Trainer(object):
             avg_loss += 10 if np.isnan(l) else l
             avg_acc += 0 if np.isnan(acc) else acc
 
+        # note down input wait
+        self.input_wait = input_wait
+
         # print info
-        log = 'Evaluation - loss : {}; accuracy : {}'.format(avg_loss/(num_iterations),
-                            avg_acc/(num_iterations))
-        tqdm.write(log)
+        log = 'Evaluation - loss : {}; accuracy : {}; input wait : {:.2f}s'.format(
+                avg_loss/(num_iterations), avg_acc/(num_iterations), input_wait)
+        tqdm.write(log + prefetch_log(feed))
 
         # return average loss and accuracy
         acc = avg_acc/num_iterations
@@ -90,13 +153,17 @@ class Trainer(object):
     def fit(self, epochs, 
             eval_interval=0, mode=1, lr=None,
             batch_size=None, feed=None, verbose=True, 
-            visualizer=None, early_stop_after=1):
+            visualizer=None, early_stop_after=1,
+            resume=False, tracer=None,
+            steps_per_run=1, # K steps in one sess.run (model.multistep_losses)
+            accumulate_steps=1): # micro-batches per update (model.accumulate_op)
 
         def tq(x):
             return tqdm(x) if verbose else x
 
         model = self.model
         sess = self.sess
+        timer = self.timer
 
         # set batch size
         batch_size = batch_size if batch_size else self.batch_size
@@ -109,44 +176,180 @@ class Trainer(object):
         num_examples = feed.getN()
         num_iterations = num_examples//batch_size
 
-        #build_feed = self.build_feed_dict if n == 1 else self.build_feed_dict_multi
+        # multi-tower model (Model.make_parallel)
+        #  global batch is split among towers
+        towers = self.check_towers(model.placeholders, batch_size)
+
+        # multiple steps per run need in-graph loop
+        if steps_per_run > 1 and getattr(model, 'multistep_losses', None) is None:
+            tqdm.write(':: Model has no multistep graph; running 1 step per run')
+            steps_per_run = 1
+
+        # in-graph input pipeline -> no feed_dict
+        #  (model built with inputs=pipeline)
+        piped = isinstance(feed, Pipeline)
+        if piped:
+            feed.initialize(sess)
+            batch_size = feed.batch_size
+            num_iterations = num_examples//batch_size
+            steps_per_run = 1
+
+        # gradient accumulation
+        #  one update every accumulate_steps batches
+        if accumulate_steps > 1:
+            if getattr(model, 'accumulate_op', None) is None:
+                raise ValueError('accumulate_steps needs Model(accumulate=True)')
+            if steps_per_run > 1:
+                tqdm.write(':: Gradient accumulation; running 1 step per run')
+                steps_per_run = 1
+
+        # snapshot (eval), checkpointer
+        self.prepare(keep_best=bool(eval_interval))
 
         loss_trend, accuracies = [], []
-        model_params = None
-        for i in range(epochs):
-            avg_loss = 0.
-            for j in tq(range(num_iterations)):
-
-                bj = feed.next_batch(batch_size)
-
-                # fetch items
-                fetch_data = [model.loss, model.train_op]
-
-                if visualizer:
+        # best params saved to snapshot
+        saved = False
+
+        # resume from checkpoint
+        #  (True -> latest, str -> checkpoint path)
+        start_epoch, start_iteration, start_loss = 0, 0, 0.
+        if resume and self.checkpointer:
+            state = self.checkpointer.restore(sess, 
+                    resume if type(resume) == str else None)
+            if state:
+                start_epoch, start_iteration = state['epoch'], state['iteration']
+                start_loss, self.step = state['avg_loss'], state['step']
+                loss_trend, accuracies = state['loss_trend'], state['accuracies']
+                saved = state['saved'] and self.snapshot is not None
+                if state['feed'] is not None:
+                    feed.restore(state['feed'])
+                tqdm.write(':: Resuming from epoch {}, iteration {}'.format(
+                    start_epoch, start_iteration))
+
+        for i in range(start_epoch, epochs):
+            resumed = i == start_epoch
+            avg_loss = start_loss if resumed else 0.
+            # time spent waiting on feed, running graph
+            input_wait, run_time = 0., 0.
+            # examples/sec of each tower (sampled run)
+            tower_rates = []
+            if isinstance(feed, Prefetcher):
+                feed.reset_stats()
+            for j in tq(range(start_iteration if resumed else 0, num_iterations, 
+                    steps_per_run)):
+                # num of steps in this run
+                k = min(steps_per_run, num_iterations - j)
+
+                if timer:
+                    timer.start()
+
+                start = time.time()
+                bj = [ [] if piped else feed.next_batch(batch_size) 
+                        for _ in range(k) ]
+                input_wait += time.time() - start
+
+                if timer:
+                    timer.mark('fetch')
+
+                if k > 1:
+                    # stage k batches -> [k, batch_size, ...]
+                    bj = stack_batches(bj)
+                    fetch_data = [model.multistep_losses]
+                    placeholders = model.multistep_placeholders
+                else:
+                    bj = bj[0]
+                    # fetch items
+                    fetch_data = [model.loss, model.accumulate_op 
+                            if accumulate_steps > 1 else model.train_op]
+                    placeholders = model.placeholders
+
+                # no summary op in multistep graph
+                summarize = visualizer and k == 1
+                if summarize:
                     fetch_data.append(visualizer.summary_op)
                     
                 # build feed_dict
                 feed_dict = self.extra_params(
-                        self.build_feed_dict(model.placeholders, bj), 
+                        self.build_feed(placeholders, bj), 
                         mode, lr)
 
-
+                if timer:
+                    timer.mark('feed_dict')
+
+                # full trace of chosen steps
+                #  (a run covers steps step+1 .. step+k)
+                run_kwargs = tracer.run_kwargs(self.step + 1, 
+                        self.step + k) if tracer else {}
+                traced = bool(run_kwargs)
+                # multi-tower -> trace last run of epoch (after warm-up),
+                #  for per-tower throughput
+                sampled = towers > 1 and j + k >= num_iterations
+                if sampled and not traced:
+                    run_kwargs = { 'run_metadata' : tf.RunMetadata(),
+                            'options' : tf.RunOptions(
+                                trace_level=tf.RunOptions.FULL_TRACE) }
+                start = time.time()
                 results = sess.run( fetch_data, 
-                                    feed_dict = feed_dict)
-
-                l = results[0]
-
-                if visualizer:
+                                    feed_dict = feed_dict, **run_kwargs)
+                run_time += time.time() - start
+                if traced:
+                    tracer.collect(self.step + 1, run_kwargs['run_metadata'],
+                            last=self.step + k)
+                if sampled:
+                    tower_rates = tower_throughput(run_kwargs['run_metadata'],
+                            self.tower_devices(), k*batch_size//len(model.GPUs))
+
+                # sum of per-step losses
+                l = np.sum(results[0])
+
+                # apply accumulated gradients
+                #  (last update of epoch may use fewer batches)
+                if accumulate_steps > 1 and (
+                        (j+1) % accumulate_steps == 0 or j+1 == num_iterations):
+                    sess.run(model.apply_op)
+
+                if timer:
+                    timer.mark('run')
+
+                if summarize:
                     if i % visualizer.interval == 0:
                         visualizer.train_log(results[-1], j)
 
+                if timer:
+                    timer.mark('summary')
+                    timer.end(self.step + k, bj, batch_size*k, visualizer)
+
                 # accumulate loss
                 avg_loss += l
 
+                self.step += k
+                # checkpoint in background
+                #  (once a multiple of checkpoint_steps is crossed)
+                if self.checkpointer and (
+                        self.step // self.checkpoint_steps > 
+                        (self.step - k) // self.checkpoint_steps):
+                    self.checkpointer.save(sess, self.step, {
+                        'epoch' : i, 'iteration' : j+k, 'step' : self.step,
+                        'avg_loss' : avg_loss, 'loss_trend' : list(loss_trend),
+                        'accuracies' : list(accuracies), 
+                        'saved' : saved and self.checkpoint_snapshot,
+                        'feed' : feed.state() if hasattr(feed, 'state') else None
+                        })
+
+            # note down input wait
+            self.input_wait = input_wait
+
             if verbose:
-                log = '[{}] loss : {}'.format(i, 
-                        avg_loss/(num_iterations))
-                tqdm.write(log)
+                log = '[{}] loss : {}; input wait : {:.2f}s'.format(i, 
+                        avg_loss/(num_iterations), input_wait)
+                if towers > 1:
+                    # examples/sec while graph runs (all towers),
+                    #  and of each tower device, in last run of epoch
+                    log += '; {} towers : {:.1f} examples/sec ({})'.format(
+                            towers, num_iterations*batch_size/max(run_time, 1e-9),
+                            ', '.join( '{}: {:.1f}'.format(device, rate)
+                                for device, rate in tower_rates ))
+                tqdm.write(log + prefetch_log(feed))
 
             # update lr
             #if i and i%25 == 0:
@@ -163,25 +366,34 @@ class Trainer(object):
                     # check if accuracy is better
                     if len(accuracies) > 2 and eacc > max(accuracies[:-1]):
                         # save model params
-                        model_params = sess.run(tf.trainable_variables())
+                        self.snapshot.save(sess)
+                        saved = True
 
                     if early_stop_after and i > early_stop_after:
                         if early_stopping(loss_trend) or eacc > 0.95:
                             tqdm.write('stopping from early stopping')
 
                             # set best performing model params
-                            if model_params:
+                            if saved:
                                 print(':: Setting best model params')
-                                sess.run(set_op(model_params))
+                                self.snapshot.restore(sess)
+
+                            # finish pending checkpoint
+                            if self.checkpointer:
+                                self.checkpointer.wait()
 
                             # return max evaluation accuracy
                             return max(accuracies)
 
         # set best performing model params
-        if model_params:
-            sess.run(set_op(model_params))
+        if saved:
+            self.snapshot.restore(sess)
+        # finish pending checkpoint
+        if self.checkpointer:
+            self.checkpointer.wait()
         # end of epochs
-        return max(accuracies)
+        #  (no evaluation -> 0)
+        return max(accuracies) if accuracies else 0.
 
 
     def build_feed_dict_multi(self, ll1, ll2):
@@ -198,13 +410,91 @@ class Trainer(object):
     def build_feed_dict(self, l1, l2):
         return { i:j for i,j in zip(l1,l2)}
 
+    def build_feed(self, placeholders, batch):
+        # multi-tower model -> one shard of batch per tower
+        towers = self.towers(placeholders)
+        if towers > 1:
+            return self.build_feed_dict_multi(placeholders, 
+                    shard_batch(batch, towers))
+        return self.build_feed_dict(placeholders, batch)
+
+    def towers(self, placeholders):
+        # list of list of placeholders -> num of towers
+        if placeholders and type(placeholders[0]) == list:
+            return len(placeholders)
+        return 1
+
+    def tower_devices(self):
+        # device of each tower, as named in step stats
+        #  ('/gpu:1' -> 'device:GPU:1')
+        return [ 'device:{}:{}'.format(self.model.device.upper(), device)
+                for device in self.model.GPUs ]
+
+    def check_towers(self, placeholders, batch_size):
+        # equal shards -> no rows dropped
+        towers = self.towers(placeholders)
+        if batch_size % towers:
+            raise ValueError('batch_size {} is not divisible by {} towers'.format(
+                batch_size, towers))
+        # shared passages (pidx into passages of whole batch)
+        #  cannot be split into equal shards along axis 0
+        if towers > 1 and getattr(self.model, 'share_passages', False):
+            raise ValueError('share_passages is not supported with {} towers'.format(
+                towers))
+        return towers
+
     def extra_params(self, feed_dict, mode, lr=None):
-        feed_dict[self.model.mode] = mode
-        if lr:
-            feed_dict[self.model.lr] = lr
+        # default placeholders of each tower
+        modes, lrs = self.model.mode, self.model.lr
+        if type(modes) != list:
+            modes, lrs = [modes], [lrs]
+        for mode_, lr_ in zip(modes, lrs):
+            feed_dict[mode_] = mode
+            if lr:
+                feed_dict[lr_] = lr
         return feed_dict
 
 
+def prefetch_log(feed):
+    # avg wait on queue of prefetched batches
+    if isinstance(feed, Prefetcher):
+        return '; prefetch wait : {:.2f}ms/batch'.format(feed.avg_wait()*1000)
+    return ''
+
+
+def tower_throughput(run_metadata, devices, examples):
+    '''
+        tower_throughput(tf.RunMetadata, list : devices, int : examples) 
+            -> [(device, examples/sec)]
+            examples of each device over its busy time in a traced run
+             (start of first op -> end of last op on device)
+    '''
+    rates = []
+    for device in devices:
+        nodes = [ node for dev_stats in run_metadata.step_stats.dev_stats
+                if dev_stats.device.endswith(device)
+                for node in dev_stats.node_stats ]
+        if not nodes:
+            continue
+        start = min( node.all_start_micros for node in nodes )
+        end = max( node.all_start_micros + node.all_end_rel_micros 
+                for node in nodes )
+        rates.append((device, examples*1e6/max(end - start, 1)))
+    return rates
+
+
+def shard_batch(batch, n):
+    # batch -> n equal shards (remainder rows dropped)
+    size = len(batch[0])//n if batch else 0
+    return [ [ field[k*size:(k+1)*size] for field in batch ] 
+            for k in range(n) ]
+
+
+def stack_batches(batches):
+    # k batches -> one batch of [k, batch_size, ...] fields
+    return [ np.stack(field) for field in zip(*batches) ]
+
+
 def early_stopping(loss_trend):
     if len(loss_trend) < 4:
         return False
@@ -35,6 +35,13 @@ class Visualizer(object):
     def eval_log(self, summary, i):
         self.eval_writer.add_summary(summary, i)
 
+    def log_scalars(self, scalars, i, eval=False):
+        # python values -> summary (no ops in graph)
+        summary = tf.Summary(value=[ tf.Summary.Value(tag=k, simple_value=v)
+            for k,v in scalars.items() ])
+        writer = self.eval_writer if eval else self.writer
+        writer.add_summary(summary, i)
+
     def variable_summaries(self, var, name='summaries'):
       """Attach a lot of summaries to a Tensor (for TensorBoard visualization)."""
       with tf.name_scope(name):